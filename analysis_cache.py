@@ -0,0 +1,108 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+# ------------------------
+# 分析结果磁盘缓存
+# 以音频文件内容哈希 + 分析参数为键，每个条目是一个目录：
+#   meta.json   采样率、时长等标量
+#   <名字>.npy  特征数组，读取时用 mmap 映射，不整块载入内存
+# 按最近使用时间做 LRU 淘汰，总大小不超过 max_bytes
+# ------------------------
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".music_fireworks_cache")
+MAX_CACHE_BYTES = 2 * 1024**3
+CACHE_VERSION = 1  # 分析算法变化时加一，旧缓存自然失效
+
+def file_hash(path, block_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+class AnalysisCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._hashes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, path, params):
+        path = os.path.abspath(path)
+        if path not in self._hashes:
+            self._hashes[path] = file_hash(path)
+        params = dict(params, v=CACHE_VERSION)
+        text = self._hashes[path] + json.dumps(params, sort_keys=True)
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def load(self, key):
+        """命中返回 (arrays, meta)，数组为只读内存映射；未命中返回 None"""
+        entry = os.path.join(self.directory, key)
+        meta_path = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(entry, name + ".npy"), mmap_mode='r')
+                      for name in meta["arrays"]}
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(meta_path)  # 记录最近使用时间，供 LRU 淘汰
+        return arrays, meta
+
+    def store(self, key, arrays, meta):
+        entry = os.path.join(self.directory, key)
+        tmp = entry + ".tmp%d" % os.getpid()
+        os.makedirs(tmp, exist_ok=True)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(arr))
+        meta = dict(meta, arrays=sorted(arrays))
+        with open(os.path.join(tmp, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # 其他进程已经写好了同一个条目
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+        return meta
+
+    def get_or_compute(self, path, params, compute):
+        """compute() 返回 (arrays, meta)；命中缓存时完全跳过 compute"""
+        key = self.key(path, params)
+        hit = self.load(key)
+        if hit is not None:
+            return hit
+        arrays, meta = compute()
+        meta = self.store(key, arrays, meta)
+        return arrays, meta
+
+    def entries(self):
+        """返回 [(最近使用时间, 字节数, 目录)]"""
+        result = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            meta_path = os.path.join(entry, "meta.json")
+            if not os.path.exists(meta_path):
+                continue
+            size = sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+            result.append((os.path.getmtime(meta_path), size, entry))
+        return result
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                shutil.rmtree(entry)
+            except OSError:
+                continue  # Windows 上正被映射的文件删不掉，跳过
+            total -= size
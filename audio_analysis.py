@@ -0,0 +1,434 @@
+import io
+import struct
+import threading
+import numpy as np
+
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+# ------------------------
+# pydub 推迟到第一次真正解码时才导入（缓存命中时根本不导入），ffmpeg 路径先记下来
+# ------------------------
+FFMPEG = {}
+
+def configure_ffmpeg(converter, ffprobe):
+    FFMPEG.update(converter=converter, ffprobe=ffprobe)
+
+def _audio_segment():
+    from pydub import AudioSegment
+    for name, path in FFMPEG.items():
+        setattr(AudioSegment, name, path)
+    return AudioSegment
+
+# ------------------------
+# 解码后的音频：只用 ffmpeg 解码一次，播放和分析共享同一块 PCM 缓冲区
+# ------------------------
+class DecodedAudio:
+    def __init__(self, samples, frame_rate, sample_width):
+        self.samples = samples  # (采样数, 声道数)，可以是普通数组也可以是缓存里的内存映射
+        self.frame_rate = frame_rate
+        self.channels = samples.shape[1]
+        self.sample_width = sample_width
+
+    @classmethod
+    def from_segment(cls, segment):
+        # raw_data 就是 AudioSegment 内部的 bytes，frombuffer 只建只读视图，不复制
+        pcm = np.frombuffer(segment.raw_data, dtype=SAMPLE_DTYPES[segment.sample_width])
+        return cls(pcm.reshape((-1, segment.channels)), segment.frame_rate, segment.sample_width)
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_segment(_audio_segment().from_file(path))
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.frame_rate
+
+    def channel(self, index=0):
+        """单个声道的跨步视图（不复制）"""
+        return self.samples[:, index]
+
+    def wav_stream(self):
+        """同一块缓冲区包装成只读的 WAV 文件对象，交给 pygame.mixer.music 播放"""
+        return WavStream(self.samples, self.frame_rate, self.sample_width)
+
+# ------------------------
+# 内存中的 WAV 文件：44 字节文件头 + PCM 缓冲区本身的内存视图，不复制采样
+# pygame.mixer.music 边播放边 read()，因此 pydub 能解码的格式都能交给 mixer 播放，并能读到播放位置
+# ------------------------
+class WavStream(io.RawIOBase):
+    def __init__(self, samples, frame_rate, sample_width):
+        if sample_width == 1:
+            samples = (samples.astype(np.int16) + 128).astype(np.uint8)  # 8 位 WAV 是无符号的
+        data = memoryview(np.ascontiguousarray(samples)).cast("B")
+        channels = samples.shape[1]
+        self.header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data.nbytes, b"WAVE",
+                                  b"fmt ", 16, 1, channels, frame_rate, frame_rate * channels * sample_width,
+                                  channels * sample_width, sample_width * 8, b"data", data.nbytes)
+        self.data = data
+        self.size = len(self.header) + data.nbytes
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = (0, self.pos, self.size)[whence]
+        self.pos = max(0, min(self.size, base + offset))
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def readinto(self, buffer):
+        out = memoryview(buffer).cast("B")
+        done = 0
+        head = len(self.header)
+        if self.pos < head:
+            done = min(len(out), head - self.pos)
+            out[:done] = self.header[self.pos:self.pos + done]
+            self.pos += done
+        count = min(len(out) - done, self.size - self.pos)
+        if count > 0:
+            out[done:done + count] = self.data[self.pos - head:self.pos - head + count]
+            self.pos += count
+            done += count
+        return done
+
+# ------------------------
+# 振幅包络：加载时一次算出整首歌每个显示帧的 RMS / 峰值
+# ------------------------
+class Envelope:
+    def __init__(self, rms, peak, samples_per_frame, fps):
+        self.rms = rms
+        self.peak = peak
+        self.samples_per_frame = samples_per_frame
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.rms)
+
+    def at(self, frame):
+        """按帧号查 RMS，越界返回 0"""
+        if 0 <= frame < len(self.rms):
+            return self.rms[frame]
+        return 0
+
+    def at_time(self, seconds):
+        return self.at(int(seconds * self.fps))
+
+def amplitude_envelope(channel, frame_rate, fps):
+    """把单声道采样按每帧 frame_rate/fps 个采样 reshape 成二维，一次向量化算出每帧 RMS 和峰值"""
+    samples_per_frame = int(frame_rate / fps)
+    total_frames = len(channel) // samples_per_frame
+    frames = channel[:total_frames * samples_per_frame].astype(np.float32)
+    frames = frames.reshape(total_frames, samples_per_frame)
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / samples_per_frame)
+    peak = np.abs(frames).max(axis=1) if total_frames else np.zeros(0, dtype=np.float32)
+    return Envelope(rms.astype(np.float32), peak, samples_per_frame, fps)
+
+# ------------------------
+# 带缓存的加载：命中缓存时不再调用 ffmpeg，也不再重新分析
+# ------------------------
+_preloaded = {}  # 路径 -> (线程, 结果)
+
+def preload_audio(path, cache=None):
+    """在后台线程里先开始解码（缓存命中时只是映射 PCM），与 pygame 初始化、建窗口、加载字体同时进行
+    之后对同一路径的 load_audio 直接取这份结果"""
+    if path is None or path in _preloaded:
+        return
+    result = {}
+
+    def run():
+        try:
+            result["audio"] = _load_audio(path, cache)
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    _preloaded[path] = (thread, result)
+
+def load_audio(path, cache=None):
+    preload = _preloaded.pop(path, None)
+    if preload is None:
+        return _load_audio(path, cache)
+    thread, result = preload
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["audio"]
+
+def _load_audio(path, cache):
+    if cache is None:
+        return DecodedAudio.load(path)
+
+    def compute():
+        audio = DecodedAudio.load(path)
+        return {"pcm": audio.samples}, {"frame_rate": audio.frame_rate,
+                                        "sample_width": audio.sample_width,
+                                        "duration": audio.duration}
+
+    arrays, meta = cache.get_or_compute(path, {"kind": "pcm"}, compute)
+    return DecodedAudio(arrays["pcm"], meta["frame_rate"], meta["sample_width"])
+
+def load_envelope(path, fps, cache=None, audio=None):
+    """audio 为已解码的音频时直接复用，否则缓存未命中才解码"""
+    def compute():
+        decoded = audio if audio is not None else DecodedAudio.load(path)
+        env = amplitude_envelope(decoded.channel(0), decoded.frame_rate, fps)
+        return {"rms": env.rms, "peak": env.peak}, {"samples_per_frame": env.samples_per_frame,
+                                                    "frame_rate": decoded.frame_rate,
+                                                    "duration": decoded.duration}
+
+    if cache is None:
+        arrays, meta = compute()
+    else:
+        arrays, meta = cache.get_or_compute(path, {"kind": "envelope", "fps": fps}, compute)
+    return Envelope(arrays["rms"], arrays["peak"], meta["samples_per_frame"], fps)
+
+# ------------------------
+# 起音（onset）检测：整首歌一次性算谱通量，再挑峰值
+# 每个显示帧一个 STFT 帧（hop = 每帧采样数），帧中心对齐显示帧的起点
+# ------------------------
+ONSET_FFT = 2048
+ONSET_BANDS = 24
+ONSET_BLOCK = 1024  # 每次向量化处理的帧数，限制临时数组大小
+
+def log_band_matrix(n_fft, frame_rate, bands, fmin=30.0, fmax=16000.0):
+    """(频点数, bands) 的 0/1 矩阵，把 rfft 频点按对数间隔归并成频带；太窄的低频带至少含一个频点"""
+    freqs = np.fft.rfftfreq(n_fft, 1 / frame_rate)
+    edges = np.geomspace(fmin, min(fmax, frame_rate / 2), bands + 1)
+    matrix = np.zeros((len(freqs), bands), dtype=np.float32)
+    for b in range(bands):
+        members = (freqs >= edges[b]) & (freqs < edges[b + 1])
+        if not members.any():
+            members = np.abs(freqs - np.sqrt(edges[b] * edges[b + 1])) == np.abs(freqs - np.sqrt(edges[b] * edges[b + 1])).min()
+        matrix[members, b] = 1.0
+    return matrix
+
+def spectral_flux(channel, samples_per_frame, frame_rate, n_fft=ONSET_FFT, bands=ONSET_BANDS):
+    """返回每个显示帧的谱通量：对数频带能量相对上一帧的正增量之和
+    先归并成对数间隔的频带，低音鼓（只占几个频点）和宽带的军鼓、镲片权重相当"""
+    band_matrix = log_band_matrix(n_fft, frame_rate, bands)
+    total_frames = len(channel) // samples_per_frame
+    flux = np.zeros(total_frames, dtype=np.float32)
+    prev = None
+    for start, magnitude in stft_blocks(channel, samples_per_frame, n_fft, total_frames):
+        spectrum = np.log1p(magnitude @ band_matrix)
+        if prev is None:
+            prev = spectrum[:1]
+        diff = np.diff(spectrum, axis=0, prepend=prev)
+        flux[start:start + len(magnitude)] = np.maximum(diff, 0).sum(axis=1)
+        prev = spectrum[-1:]
+    return flux
+
+def stft_blocks(channel, samples_per_frame, n_fft, total_frames):
+    """每个显示帧一个加汉宁窗的 STFT 帧（帧中心对齐显示帧起点），每次产出 (起始帧号, ONSET_BLOCK 帧的幅度谱)"""
+    padded = np.pad(np.asarray(channel, dtype=np.float32), (n_fft // 2, n_fft))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, n_fft)[::samples_per_frame][:total_frames]
+    window = np.hanning(n_fft).astype(np.float32)
+    for start in range(0, total_frames, ONSET_BLOCK):
+        block = frames[start:start + ONSET_BLOCK] * window
+        yield start, np.abs(np.fft.rfft(block, axis=1)).astype(np.float32)
+
+def pick_onsets(flux, fps, pre=0.1, post=0.05, average=0.3, delta=0.1, min_gap=0.1):
+    """峰值挑选：局部最大、高于附近均值 + delta，且与上一个起音至少间隔 min_gap 秒
+    返回 (帧号数组, 0~1 的强度数组)"""
+    if len(flux) == 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    scale = np.percentile(flux, 99) or 1.0
+    novelty = np.minimum(flux / scale, 1.0)
+    pre_n, post_n, avg_n = int(pre * fps), int(post * fps), int(average * fps)
+    # 滑动最大值：[i-pre_n, i+post_n]
+    padded = np.pad(novelty, (pre_n, post_n), constant_values=-np.inf)
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, pre_n + post_n + 1).max(axis=1)
+    # 滑动均值：[i-avg_n, i+post_n]，用累加和一次算出
+    csum = np.concatenate(([0.0], np.cumsum(novelty, dtype=np.float64)))
+    idx = np.arange(len(novelty))
+    lo = np.maximum(idx - avg_n, 0)
+    hi = np.minimum(idx + post_n + 1, len(novelty))
+    local_mean = (csum[hi] - csum[lo]) / (hi - lo)
+    candidates = np.flatnonzero((novelty == local_max) & (novelty >= local_mean + delta))
+    gap = max(1, int(min_gap * fps))
+    keep = []
+    last = -gap
+    for i in candidates.tolist():
+        if i - last >= gap:
+            keep.append(i)
+            last = i
+    frames = np.array(keep, dtype=np.int32)
+    return frames, novelty[frames].astype(np.float32)
+
+def load_onsets(path, fps, cache=None, audio=None):
+    """返回 (起音帧号, 强度)，帧号与 load_envelope 的帧对齐"""
+    def compute():
+        decoded = audio if audio is not None else DecodedAudio.load(path)
+        samples_per_frame = int(decoded.frame_rate / fps)
+        flux = spectral_flux(decoded.channel(0), samples_per_frame, decoded.frame_rate)
+        frames, strength = pick_onsets(flux, fps)
+        return {"frames": frames, "strength": strength}, {"count": len(frames)}
+
+    if cache is None:
+        arrays, _ = compute()
+    else:
+        arrays, _ = cache.get_or_compute(path, {"kind": "onsets", "fps": fps, "n_fft": ONSET_FFT, "bands": ONSET_BANDS}, compute)
+    return np.asarray(arrays["frames"]), np.asarray(arrays["strength"])
+
+# ------------------------
+# 滤波器组特征：整首歌的 STFT 按 N 个 mel（或对数）间隔的三角滤波器归并成频带幅度
+# 权重矩阵只建一次，每批帧一次矩阵乘法，得到 (帧数, 频带数) 的 float32 表，帧与 load_envelope 对齐
+# 每个频带的值是带内各频点的加权平均幅度，再除以窗函数之和，数值不随帧长变化
+# 各场景用 BandTable.features({"名字": (下限Hz, 上限Hz)}) 按频率范围取出自己要的几路特征
+# ------------------------
+FILTERBANK_FFT = 2048
+FILTERBANK_BANDS = 32
+
+def hz_to_mel(f):
+    return 2595 * np.log10(1 + np.asarray(f) / 700)
+
+def mel_to_hz(m):
+    return 700 * (10 ** (np.asarray(m) / 2595) - 1)
+
+def filterbank_matrix(n_fft, frame_rate, bands=FILTERBANK_BANDS, scale="mel", fmin=30.0, fmax=16000.0):
+    """返回 ((频点数, bands) 的三角滤波器权重，每列和为 1；各频带中心频率)"""
+    freqs = np.fft.rfftfreq(n_fft, 1 / frame_rate)
+    fmax = min(fmax, frame_rate / 2)
+    if scale == "mel":
+        edges = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), bands + 2))
+    else:
+        edges = np.geomspace(fmin, fmax, bands + 2)
+    matrix = np.zeros((len(freqs), bands), dtype=np.float32)
+    for b in range(bands):
+        lo, center, hi = edges[b:b + 3]
+        weights = np.maximum(0, np.minimum((freqs - lo) / (center - lo), (hi - freqs) / (hi - center)))
+        if not weights.any():  # 低频带比频点间隔还窄：取最近的一个频点
+            weights[np.argmin(np.abs(freqs - center))] = 1.0
+        matrix[:, b] = weights / weights.sum()
+    return matrix, edges[1:-1].astype(np.float32)
+
+def band_energies(channel, samples_per_frame, frame_rate, bands=FILTERBANK_BANDS, scale="mel", n_fft=FILTERBANK_FFT):
+    """返回 ((帧数, bands) 的 float32 频带幅度表, 各频带中心频率)"""
+    matrix, centers = filterbank_matrix(n_fft, frame_rate, bands, scale)
+    matrix /= np.hanning(n_fft).sum()  # 归一化并入权重矩阵，每批仍只有一次矩阵乘法
+    total_frames = len(channel) // samples_per_frame
+    table = np.zeros((total_frames, bands), dtype=np.float32)
+    for start, magnitude in stft_blocks(channel, samples_per_frame, n_fft, total_frames):
+        table[start:start + len(magnitude)] = magnitude @ matrix
+    return table, centers
+
+class BandTable:
+    def __init__(self, table, centers, fps):
+        self.table = table        # (帧数, 频带数)
+        self.centers = centers    # 各频带中心频率（Hz）
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.table)
+
+    def normalized(self, percentile=95, floor=0.01):
+        """每个频带除以它在整首歌中的 percentile 分位数并截到 0~1，低频和高频的起伏可以直接比较
+        分母不低于整张表 RMS 的 floor 倍（默认 -40 dB）：整首歌几乎无声的频带保持接近 0，不会被放大到满幅"""
+        if len(self.table):
+            level = np.sqrt(np.mean(np.square(self.table, dtype=np.float64)))
+            scale = np.maximum(np.percentile(self.table, percentile, axis=0), floor * level)
+        else:
+            scale = 1.0
+        table = np.minimum(self.table / np.maximum(scale, 1e-9), 1.0).astype(np.float32)
+        return BandTable(table, self.centers, self.fps)
+
+    def select(self, lo=0.0, hi=None):
+        """中心频率在 [lo, hi) 内的频带取平均，返回每帧一个值；范围内没有频带时取最近的一个"""
+        members = (self.centers >= lo) & (self.centers < (np.inf if hi is None else hi))
+        if not members.any():
+            middle = lo if hi is None else np.sqrt(max(lo, 1.0) * hi)
+            members = np.arange(len(self.centers)) == np.argmin(np.abs(self.centers - middle))
+        return self.table[:, members].mean(axis=1)
+
+    def features(self, ranges):
+        """{"名字": (下限Hz, 上限Hz 或 None)} -> {"名字": 每帧一个值的数组}，由场景决定哪些频带驱动哪些参数"""
+        return {name: self.select(lo, hi) for name, (lo, hi) in ranges.items()}
+
+def load_band_table(path, fps, cache=None, audio=None, bands=FILTERBANK_BANDS, scale="mel"):
+    """整首歌的滤波器组特征，按文件内容缓存"""
+    def compute():
+        decoded = audio if audio is not None else DecodedAudio.load(path)
+        samples_per_frame = int(decoded.frame_rate / fps)
+        table, centers = band_energies(decoded.channel(0), samples_per_frame, decoded.frame_rate, bands, scale)
+        return {"table": table, "centers": centers}, {"bands": bands}
+
+    if cache is None:
+        arrays, _ = compute()
+    else:
+        arrays, _ = cache.get_or_compute(path, {"kind": "filterbank", "fps": fps, "n_fft": FILTERBANK_FFT,
+                                                "bands": bands, "scale": scale}, compute)
+    return BandTable(np.asarray(arrays["table"]), np.asarray(arrays["centers"]), fps)
+
+# ------------------------
+# 雨落场景的分块特征：每 chunk_size 个采样一块，算 RMS 和低频 / 中高频幅度和
+# 块之间互不依赖，可以整段交给 parallel_features.map_chunks 分进程计算
+# 整首歌按块排成 (块数, 帧长) 的跨步视图，一次 rfft 批量算完（分 CHUNK_BLOCK 块一批，限制临时数组大小）
+# 两个频段在 rfft 频点上是连续区间，预先算好下标范围，不再逐块生成布尔掩码
+# 默认（无窗、无重叠）与逐块计算的结果在 float32 精度内一致；
+# overlap > 0 时每块的分析帧向后延伸到 chunk_size / (1 - overlap)，块数和时间对齐不变
+# ------------------------
+CHUNK_BLOCK = 2048
+CHUNK_BANDS = ((20, 250), (250, 2000))
+
+def chunk_frame_length(chunk_size, overlap=0.0):
+    return chunk_size if not overlap else int(round(chunk_size / (1 - overlap)))
+
+def chunk_lookahead(chunk_size, overlap=0.0):
+    """每块分析帧超出块本身的采样数；分段计算时每段要多带这么多采样"""
+    return chunk_frame_length(chunk_size, overlap) - chunk_size
+
+def _band_ranges(frame_len, frame_rate):
+    """低频 [20, 250]、中高频 (250, 2000] 对应的 rfft 频点下标范围"""
+    from scipy.fft import rfftfreq
+    xf = rfftfreq(frame_len, 1 / frame_rate)
+    (low_lo, low_hi), (high_lo, high_hi) = CHUNK_BANDS
+    return ((np.searchsorted(xf, low_lo, "left"), np.searchsorted(xf, low_hi, "right")),
+            (np.searchsorted(xf, high_lo, "right"), np.searchsorted(xf, high_hi, "right")))
+
+def _band_sums(frames, frame_rate, window=None):
+    """frames: (帧数, 帧长) float32，返回 (帧数, 2) 的频段幅度和"""
+    from scipy.fft import rfft  # 只有雨落场景需要 scipy；float32 输入直接得到 complex64
+    from scipy.signal import get_window
+    frame_len = frames.shape[1]
+    (a, b), (c, d) = _band_ranges(frame_len, frame_rate)
+    taper = None if window is None else get_window(window, frame_len).astype(np.float32)
+    out = np.empty((len(frames), 2), dtype=np.float32)
+    for start in range(0, len(frames), CHUNK_BLOCK):
+        block = frames[start:start + CHUNK_BLOCK]
+        if taper is not None:
+            block = block * taper
+        magnitude = np.abs(rfft(block, axis=1)[:, a:d])  # 只取两个频段覆盖的频点
+        out[start:start + len(block), 0] = magnitude[:, :b - a].sum(axis=1)
+        out[start:start + len(block), 1] = magnitude[:, c - a:].sum(axis=1)
+    return out
+
+def chunk_band_energy(samples, frame_rate, chunk_size, window=None, overlap=0.0):
+    """返回 (energy, bands)，bands 每行 (20~250Hz, 250~2000Hz)，均为 float32
+    window 为 scipy.signal.get_window 接受的窗名（如 "hann"），overlap 为相邻分析帧的重叠比例（0~1）"""
+    samples = np.asarray(samples, dtype=np.float32)
+    full = len(samples) // chunk_size
+    chunks = samples[:full * chunk_size].reshape(full, chunk_size)
+    tail = samples[full * chunk_size:]
+    energy = np.sqrt(np.einsum('ij,ij->i', chunks, chunks) / chunk_size)
+
+    frame_len = chunk_frame_length(chunk_size, overlap)
+    if frame_len > chunk_size:
+        padded = np.pad(samples, (0, frame_len - chunk_size))
+        frames = np.lib.stride_tricks.sliding_window_view(padded, frame_len)[::chunk_size][:full]
+    else:
+        frames = chunks
+    bands = _band_sums(frames, frame_rate, window)
+    if len(tail):  # 结尾不足一块的部分单独按它自己的长度算，与逐块计算一致
+        energy = np.append(energy, np.sqrt(np.mean(tail * tail)))
+        bands = np.concatenate((bands, _band_sums(tail[None, :], frame_rate, window)))
+    return energy.astype(np.float32), bands
@@ -0,0 +1,104 @@
+import sys
+import time
+import argparse
+
+# ------------------------
+# 音频时钟：报告“此刻正从扬声器发出”的采样位置，所有场景按它查分析结果
+# 以 perf_counter 为主时钟（连续、精度高），用设备播放位置（pygame.mixer）慢慢校正漂移，
+# 再减去输出延迟（混音缓冲区 + --latency 指定的额外延迟，如蓝牙音箱）
+# 实时播放都经过 pygame.mixer：各场景把分析用的同一份已解码 PCM 作为内存中的 WAV 播放，
+# pydub 能解码而 SDL_mixer 不支持的格式（如 .m4a）也能播，每首歌也只解码一次
+# ------------------------
+MIXER_BUFFER = 1024      # pygame.mixer 缓冲区采样数，决定输出延迟
+DRIFT_CORRECTION = 0.05  # 每次读到新的设备位置时，修正误差的比例
+RESYNC_SECONDS = 0.25    # 误差超过该值（卡顿、系统休眠）时直接对齐
+
+def extra_latency(argv=None):
+    """--latency 毫秒：额外的输出延迟，默认 0"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--latency", type=float, default=0.0)
+    options, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return options.latency / 1000
+
+class AudioClock:
+    def __init__(self, latency=0.0, device_position=None, is_playing=None):
+        """device_position() 返回设备已消费到的秒数（没有时为 None 或负数），is_playing() 判断是否播完"""
+        self.latency = latency
+        self.device_position = device_position
+        self.is_playing = is_playing
+        self.offset = 0.0  # 设备位置 - 墙钟 的平滑估计
+        self._start = time.perf_counter()
+        self._last_device = None
+        self._last = 0.0
+
+    def position(self):
+        """当前听到的位置（秒），单调不减"""
+        wall = time.perf_counter() - self._start
+        if self.device_position is not None:
+            device = self.device_position()
+            # 设备位置按缓冲区粒度跳变，只在读数变化时校正一次
+            if device is not None and device >= 0 and device != self._last_device:
+                self._last_device = device
+                error = device - (wall + self.offset)
+                if abs(error) > RESYNC_SECONDS:
+                    self.offset += error
+                else:
+                    self.offset += error * DRIFT_CORRECTION
+        self._last = max(self._last, wall + self.offset - self.latency, 0.0)
+        return self._last
+
+    def frame(self, fps):
+        return int(self.position() * fps)
+
+    def sample(self, frame_rate):
+        return int(self.position() * frame_rate)
+
+    def finished(self):
+        return self.is_playing is not None and not self.is_playing()
+
+    def tick(self):
+        pass  # 实时时钟随墙钟走，不需要逐帧推进
+
+class OfflineClock(AudioClock):
+    """离线渲染：音频时间完全由已渲染的帧数决定"""
+    def __init__(self, fps):
+        super().__init__()
+        self.fps = fps
+        self.frames = 0
+
+    def position(self):
+        return self.frames / self.fps
+
+    # 帧号、采样号用整数运算，避免 123 / 60 * 60 = 122.99… 这样的取整误差
+    def frame(self, fps):
+        return self.frames * fps // self.fps
+
+    def sample(self, frame_rate):
+        return self.frames * frame_rate // self.fps
+
+    def tick(self):
+        self.frames += 1
+
+# ------------------------
+# 开始播放并返回对应的时钟；应在分析全部完成、即将进入主循环时调用
+# ------------------------
+_mixer_buffer = None  # 已按哪个缓冲区大小初始化过 mixer；播放列表切歌时不必再重开设备
+
+def play_with_mixer(path, buffer=MIXER_BUFFER):
+    """path 为音频文件路径或文件对象"""
+    global _mixer_buffer
+    import pygame
+    if _mixer_buffer != buffer:
+        pygame.mixer.quit()  # pygame.init() 已按默认缓冲区初始化，重新初始化以确定延迟
+        pygame.mixer.init(buffer=buffer)
+        _mixer_buffer = buffer
+    frequency = pygame.mixer.get_init()[0]
+    pygame.mixer.music.load(path)
+    pygame.mixer.music.play()
+    return AudioClock(buffer / frequency + extra_latency(),
+                      lambda: pygame.mixer.music.get_pos() / 1000,
+                      pygame.mixer.music.get_busy)
+
+def play_decoded(audio):
+    """播放已解码的 PCM（DecodedAudio）：与分析共用同一块缓冲区，同样有设备位置校正和混音缓冲区延迟"""
+    return play_with_mixer(audio.wav_stream())
@@ -0,0 +1,176 @@
+import os
+import sys
+import csv
+import json
+import time
+import wave
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+# ------------------------
+# 七个可视化脚本的可复现跑分
+# 用合成音频（正弦脉冲 / 白噪声 / 鼓点）在无窗口、无声卡的离线渲染模式下各跑固定帧数，
+# 统计帧时间均值 / p95 / p99、实体（粒子、雨滴、雪花）峰值数量和进程峰值内存
+# 用法：python benchmark.py [--frames 600] [--json 结果.json] [--compare 基线.json]
+# ------------------------
+SCRIPTS = [
+    "烟花250831.py",
+    "烟花250901.py",
+    "音乐烟花程序.py",
+    "音乐烟花程序0902.py",
+    "音乐烟花B.py",
+    "音乐雨落B.py",
+    "音乐雪花A.py",
+]
+SAMPLE_RATE = 44100
+FPS = 60
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------------
+# 合成音频
+# ------------------------
+def sine_bursts(seconds, rng):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    gate = (t % 0.5) < 0.2  # 每 0.5 秒响 0.2 秒
+    return 0.6 * np.sin(2 * np.pi * 440 * t) * gate
+
+def white_noise(seconds, rng):
+    return np.clip(rng.normal(0, 0.3, int(seconds * SAMPLE_RATE)), -1, 1)
+
+def drums(seconds, rng):
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    beat = t % 0.5
+    kick = np.sin(2 * np.pi * 60 * beat) * np.exp(-beat * 18)
+    off = (t + 0.25) % 0.5
+    snare = rng.normal(0, 1, n) * np.exp(-off * 30) * 0.5
+    return np.clip(kick + snare, -1, 1) * 0.9
+
+SIGNALS = {"sine": sine_bursts, "noise": white_noise, "drums": drums}
+
+def write_wav(path, signal):
+    pcm = (signal * 32767).astype(np.int16)
+    stereo = np.repeat(pcm[:, None], 2, axis=1)
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(stereo.tobytes())
+
+# ------------------------
+# 运行单个脚本并测峰值内存
+# ------------------------
+def run_child(cmd, env):
+    """返回 (退出码, 峰值 RSS 字节数或 None, 输出)"""
+    with tempfile.TemporaryFile() as out:
+        proc = subprocess.Popen(cmd, cwd=HERE, env=env, stdout=out, stderr=subprocess.STDOUT)
+        peak = None
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+            peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        else:
+            try:
+                import psutil
+                p = psutil.Process(proc.pid)
+                peak = 0
+                while proc.poll() is None:
+                    try:
+                        peak = max(peak, p.memory_info().peak_wset)
+                    except psutil.Error:
+                        break
+                    time.sleep(0.05)
+            except ImportError:
+                pass
+            proc.wait()
+        out.seek(0)
+        return proc.returncode, peak, out.read().decode('utf-8', 'replace')
+
+def bench(script, wav, frames, size, workdir):
+    timing_csv = os.path.join(workdir, "timing.csv")
+    cmd = [sys.executable, os.path.join(HERE, script),
+           "--render", "none", "--music", wav, "--text", "跑分",
+           "--frames", str(frames), "--size", size, "--seed", "0",
+           "--timing-csv", timing_csv]
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    code, peak_rss, output = run_child(cmd, env)
+    if code != 0 or not os.path.exists(timing_csv):
+        return {"error": output.strip().splitlines()[-1] if output.strip() else "exit %s" % code}
+    with open(timing_csv, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    os.remove(timing_csv)
+    frame_ms = np.array([float(r["frame_ms"]) for r in rows])
+    # 实体计数列：所有行的值都是整数的列（阶段耗时是毫秒小数），不看某一行碰巧写成什么格式
+    columns = {k: np.array([float(r[k]) for r in rows]) for k in rows[0] if k not in ("frame", "frame_ms")} if rows else {}
+    counters = [k for k, values in columns.items() if np.all(values == np.round(values))]
+    entities = sum(columns[k] for k in counters) if counters else np.zeros(1)
+    return {
+        "frames": len(frame_ms),
+        "mean_ms": float(frame_ms.mean()),
+        "p95_ms": float(np.percentile(frame_ms, 95)),
+        "p99_ms": float(np.percentile(frame_ms, 99)),
+        "peak_entities": int(entities.max()),
+        "peaks": {k: int(columns[k].max()) for k in counters},
+        "peak_rss_mb": peak_rss / 1024**2 if peak_rss else None,
+    }
+
+# ------------------------
+# 汇总输出
+# ------------------------
+def fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+def print_table(results, baseline=None):
+    header = "%-22s %-6s %8s %8s %8s %8s %9s" % ("脚本", "音频", "均值ms", "p95ms", "p99ms", "峰值实体", "峰值MB")
+    print(header)
+    for key, r in results.items():
+        script, signal = key.split("|")
+        if "error" in r:
+            print("%-22s %-6s 失败：%s" % (script, signal, r["error"]))
+            continue
+        line = "%-22s %-6s %8s %8s %8s %8d %9s" % (
+            script, signal, fmt(r["mean_ms"], ".2f"), fmt(r["p95_ms"], ".2f"), fmt(r["p99_ms"], ".2f"),
+            r["peak_entities"], fmt(r["peak_rss_mb"], ".1f"))
+        old = (baseline or {}).get(key)
+        if old and "error" not in old:
+            line += "   均值 %+.1f%%  p99 %+.1f%%" % (
+                100 * (r["mean_ms"] / old["mean_ms"] - 1), 100 * (r["p99_ms"] / old["p99_ms"] - 1))
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="音乐可视化跑分")
+    parser.add_argument("--frames", type=int, default=600, help="每个场景渲染的帧数")
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--scripts", nargs="*", default=SCRIPTS)
+    parser.add_argument("--signals", nargs="*", default=list(SIGNALS), choices=list(SIGNALS))
+    parser.add_argument("--json", default=None, help="把结果写成 JSON，供下次 --compare 对比")
+    parser.add_argument("--compare", default=None, help="与之前保存的 JSON 结果对比")
+    options = parser.parse_args(argv)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    seconds = options.frames / FPS + 1
+    with tempfile.TemporaryDirectory() as workdir:
+        wavs = {}
+        for name in options.signals:
+            wavs[name] = os.path.join(workdir, name + ".wav")
+            write_wav(wavs[name], SIGNALS[name](seconds, np.random.default_rng(0)))
+        for script in options.scripts:
+            for name in options.signals:
+                print("跑分 %s / %s ..." % (script, name), file=sys.stderr)
+                results[script + "|" + name] = bench(script, wavs[name], options.frames, options.size, workdir)
+
+    print_table(results, baseline)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    main()
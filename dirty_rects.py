@@ -0,0 +1,141 @@
+import sys
+import argparse
+import numpy as np
+import pygame
+
+# ------------------------
+# 脏矩形渲染：画面稀疏时只清除、重画、提交有变化的区域，不再每帧 fill + flip 整屏
+# 屏幕划成 TILE 大小的格子，绘制前标记本帧要画的东西覆盖的格子；上一帧画过的格子也要清掉，
+# 所以本帧处理的是“上一帧 ∪ 本帧”的格子，按行合并成矩形后 fill、重画，再 display.update(rects)
+# 脏区域超过 MAX_FRACTION 时自动退回整屏 fill + flip；每 REFRESH_FRAMES 帧也整屏刷新一次，
+# 窗口被遮挡、切换全屏后的残留画面不会一直留着
+# --dirty 开启；结果与整屏重画逐像素相同
+# ------------------------
+TILE = 64
+MAX_FRACTION = 0.4
+REFRESH_FRAMES = 120
+
+class DirtyRects:
+    def __init__(self, enabled=True, tile=TILE, max_fraction=MAX_FRACTION, refresh_frames=REFRESH_FRAMES):
+        self.enabled = enabled
+        self.tile = tile
+        self.max_fraction = max_fraction
+        self.refresh_frames = refresh_frames
+        self.surface = None
+        self.prev = None        # 上一帧画过的格子
+        self.curr = None        # 本帧要画的格子
+        self.rects = None       # 本帧要重画的矩形；None 表示整屏
+        self.frames = 0
+        self.full_frames = 0
+        self.area = 0.0         # 累计重画面积占比，report() 用
+
+    @classmethod
+    def from_argv(cls, argv=None):
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument("--dirty", action="store_true")
+        options, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+        return cls(enabled=options.dirty)
+
+    def invalidate(self):
+        """画面内容整体失效（如 set_mode 切换全屏），下一帧整屏重画"""
+        self.surface = None
+
+    def begin(self, surface):
+        """每帧绘制前调用，之后用 mark_* 标记本帧要画的区域"""
+        if not self.enabled:
+            return
+        if surface is not self.surface or self.curr is None:
+            w, h = surface.get_size()
+            shape = (-(-h // self.tile), -(-w // self.tile))
+            self.prev = np.ones(shape, dtype=bool)  # 画面未知，第一帧按全部画过处理
+            self.curr = np.zeros(shape, dtype=bool)
+            self.surface = surface
+        else:
+            self.prev, self.curr = self.curr, self.prev
+            self.curr[:] = False
+
+    def mark_boxes(self, x0, y0, x1, y1):
+        """批量标记矩形 [x0, x1] x [y0, y1]（含端点，整数数组）"""
+        if not self.enabled or len(x0) == 0:
+            return
+        rows, cols = self.curr.shape
+        t = self.tile
+        tx0 = np.clip(x0 // t, 0, cols - 1)
+        tx1 = np.clip(x1 // t, 0, cols - 1)
+        ty0 = np.clip(y0 // t, 0, rows - 1)
+        ty1 = np.clip(y1 // t, 0, rows - 1)
+        # 绝大多数矩形比格子小，只跨 1~2 格；按最大跨度补齐中间的格子
+        for oy in range(int((ty1 - ty0).max()) + 1):
+            for ox in range(int((tx1 - tx0).max()) + 1):
+                self.curr[np.minimum(ty0 + oy, ty1), np.minimum(tx0 + ox, tx1)] = True
+
+    def mark_rect(self, rect):
+        if rect is not None and self.enabled:
+            self.mark_boxes(np.array([rect.left]), np.array([rect.top]),
+                            np.array([rect.right - 1]), np.array([rect.bottom - 1]))
+
+    def mark_circle(self, center, radius):
+        if self.enabled:
+            x, y = center
+            self.mark_boxes(np.array([x - radius]), np.array([y - radius]),
+                            np.array([x + radius]), np.array([y + radius]))
+
+    def clear(self, surface, color=(0, 0, 0)):
+        """清掉要重画的区域；决定本帧走脏矩形还是整屏"""
+        self.rects = None
+        if self.enabled:
+            self.frames += 1
+            dirty = self.prev | self.curr
+            fraction = dirty.mean()
+            if fraction <= self.max_fraction and self.frames % self.refresh_frames:
+                self.rects = self._merge(dirty)
+                self.area += fraction
+            else:
+                self.full_frames += 1
+                self.area += 1.0
+        if self.rects is None:
+            surface.fill(color)
+        else:
+            for rect in self.rects:
+                surface.fill(color, rect)
+
+    def blit(self, surface, source, rect):
+        """贴静态图层（文字等）：只贴到要重画的区域，其余区域保留着上一帧贴好的结果"""
+        if self.rects is None:
+            surface.blit(source, rect)
+            return
+        for i in rect.collidelistall(self.rects):
+            area = rect.clip(self.rects[i])
+            surface.blit(source, area, area.move(-rect.x, -rect.y))
+
+    def present(self):
+        if self.rects is None:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+
+    def _merge(self, dirty):
+        """每行连续的格子合并成一个矩形，上下相邻且列范围相同的再合并"""
+        t = self.tile
+        rects = []
+        above = {}  # 上一行的 (起始列, 结束列) -> 矩形
+        for row in range(dirty.shape[0]):
+            line = np.concatenate(([False], dirty[row], [False]))
+            edges = np.flatnonzero(line[1:] != line[:-1])
+            current = {}
+            for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+                rect = above.get((start, end))
+                if rect is not None:
+                    rect.height += t
+                else:
+                    rect = pygame.Rect(start * t, row * t, (end - start) * t, t)
+                    rects.append(rect)
+                current[(start, end)] = rect
+            above = current
+        return rects
+
+    def report(self):
+        if not self.enabled or not self.frames:
+            return "脏矩形渲染：关闭"
+        return "脏矩形渲染：平均重画 %.1f%% 画面，整屏 %d/%d 帧" % (
+            100 * self.area / self.frames, self.full_frames, self.frames)
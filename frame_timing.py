@@ -0,0 +1,143 @@
+import sys
+import csv
+import time
+from collections import deque
+import argparse
+import numpy as np
+import pygame
+
+# ------------------------
+# 逐帧分阶段计时
+# 主循环每帧开头调用 start()，每个阶段结束调用 mark("阶段名")
+# F3 切换屏幕统计（帧时间分位数 + 实体数量），--stats 启动时即显示
+# --timing-csv 路径：演出结束时把每帧各阶段耗时（毫秒）写成 CSV
+# 屏幕统计只用最近 history 帧；只有给了 --timing-csv 才逐帧保留完整记录，长时间播放内存不增长
+# ------------------------
+class FrameTimer:
+    def __init__(self, csv_path=None, overlay=False, history=300):
+        self.csv_path = csv_path
+        self.overlay = overlay
+        self.history = history
+        self.stages = []      # 阶段名，按第一次出现的顺序
+        self.counters = []    # 实体计数名，按第一次出现的顺序
+        self.frame_ms = deque(maxlen=history)     # 最近各帧总时长（含等待时钟），相邻两次 start() 的间隔
+        self.recent = deque(maxlen=history)       # 最近各帧 {阶段名: 毫秒, 计数名: 数量}
+        self.rows = [] if csv_path else None      # 写 CSV 用的全部帧：(每帧记录, 总时长)
+        self.peaks = {}       # 各计数出现过的最大值
+        self.frames = 0       # 已结束的帧数
+        self.current = {}
+        self._frame_start = None
+        self._last = None
+        self._font = None
+        self._overlay_surface = None
+        self._overlay_frame = None  # 统计面板最近一次重排时的帧号，同一帧只重排一次
+
+    @classmethod
+    def from_argv(cls, argv=None):
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument("--timing-csv", default=None)
+        parser.add_argument("--stats", action="store_true")
+        options, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+        return cls(csv_path=options.timing_csv, overlay=options.stats)
+
+    def start(self):
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            total = (now - self._frame_start) * 1000
+            self.frame_ms.append(total)
+            self.recent.append(self.current)
+            if self.rows is not None:
+                self.rows.append((self.current, total))
+            for name in self.counters:
+                self.peaks[name] = max(self.peaks.get(name, 0), self.current.get(name, 0))
+            self.frames += 1
+            self.current = {}
+        self._frame_start = self._last = now
+
+    def mark(self, name):
+        now = time.perf_counter()
+        if name not in self.current and name not in self.stages:
+            self.stages.append(name)
+        self.current[name] = self.current.get(name, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def percentiles(self, q=(50, 95, 99), recent=True):
+        """recent=False 时统计全部帧，只有记录了完整数据（--timing-csv）时才有意义"""
+        values = self.frame_ms if recent or self.rows is None else [total for _, total in self.rows]
+        if not values:
+            return [0.0] * len(q)
+        return np.percentile(values, q)
+
+    def stage_means(self):
+        recent = self.recent
+        if not recent:
+            return {}
+        return {name: sum(r.get(name, 0.0) for r in recent) / len(recent) for name in self.stages}
+
+    def last_work_ms(self):
+        """上一帧各阶段耗时之和（不含 clock.tick 的等待）"""
+        if not self.recent:
+            return 0.0
+        row = self.recent[-1]
+        return sum(row.get(name, 0.0) for name in self.stages)
+
+    def peak_counts(self):
+        return {name: self.peaks.get(name, 0) for name in self.counters}
+
+    def draw_overlay(self, surface, counts=None, status=None):
+        """counts 为 {名称: 数量}，无论是否显示都会记入本帧；status 为附加的一行文字（如画质等级）
+        文字每 15 帧重排一次，其余帧只做一次 blit"""
+        overlay = self._update_overlay(counts, status)
+        if overlay is not None:
+            surface.blit(overlay, (10, 10))
+
+    def overlay_rect(self, counts=None, status=None):
+        """本帧统计面板占用的矩形，隐藏时为 None；脏矩形渲染要在绘制前知道它（参数同 draw_overlay）"""
+        overlay = self._update_overlay(counts, status)
+        return None if overlay is None else overlay.get_rect(topleft=(10, 10))
+
+    def _update_overlay(self, counts, status):
+        if counts:
+            for name, value in counts.items():
+                if name not in self.counters:
+                    self.counters.append(name)
+                self.current[name] = value
+        if not self.overlay:
+            return None
+        frame = self.frames
+        if self._overlay_surface is None or (frame % 15 == 0 and frame != self._overlay_frame):
+            self._overlay_frame = frame
+            if self._font is None:
+                self._font = pygame.font.SysFont("Microsoft YaHei", 18)
+            p50, p95, p99 = self.percentiles()
+            lines = ["帧时间 p50 %.1f  p95 %.1f  p99 %.1f ms" % (p50, p95, p99),
+                     "  ".join("%s %.2f" % item for item in self.stage_means().items())]
+            if counts:
+                lines.append("  ".join("%s %d" % item for item in counts.items()))
+            if status:
+                lines.append(status)
+            rendered = [self._font.render(line, True, (255, 255, 0)) for line in lines]
+            w = max(r.get_width() for r in rendered) + 12
+            h = sum(r.get_height() for r in rendered) + 12
+            self._overlay_surface = pygame.Surface((w, h), pygame.SRCALPHA)
+            self._overlay_surface.fill((0, 0, 0, 160))
+            y = 6
+            for r in rendered:
+                self._overlay_surface.blit(r, (6, y))
+                y += r.get_height()
+        return self._overlay_surface
+
+    def write_csv(self, path=None):
+        path = path or self.csv_path
+        if not path or self.rows is None:
+            return
+        if self.current:
+            self.start()  # 收尾最后一帧
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame"] + self.stages + self.counters + ["frame_ms"])
+            for i, (row, total) in enumerate(self.rows):
+                writer.writerow([i] + ["%.3f" % row.get(name, 0.0) for name in self.stages]
+                                + [row.get(name, 0) for name in self.counters] + ["%.3f" % total])
+        p50, p95, p99 = self.percentiles(recent=False)
+        print("帧时间已写入 %s（p50 %.1f / p95 %.1f / p99 %.1f ms）" % (path, p50, p95, p99), file=sys.stderr)
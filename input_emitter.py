@@ -0,0 +1,84 @@
+import math
+import time
+import pygame
+
+# ------------------------
+# 鼠标拖动发射器：按住鼠标拖动时沿轨迹放烟花，但无论鼠标动得多快，开销都有上限
+#   1. 一帧内的所有 MOUSEMOTION 只记录轨迹点，每帧统一处理一次
+#   2. 沿轨迹每隔 spacing 像素放一枚，与事件多少无关
+#   3. 令牌桶限速：每秒最多 rate 枚，最多连发 burst 枚，没有令牌的点直接丢弃
+#   4. 与音乐烟花共用粒子预算：在场粒子 + 尚未炸开的鼠标烟花预计粒子 超出预算时不再发射
+# ------------------------
+class DragEmitter:
+    def __init__(self, spacing=80.0, rate=12.0, burst=4, particle_budget=10000):
+        self.spacing = spacing
+        self.rate = rate
+        self.burst = burst
+        self.particle_budget = particle_budget  # 可由画质调节器压低
+        self.tokens = float(burst)
+        self.pressed = False
+        self.points = []       # 本帧待处理的轨迹点（按下点 + 拖动点）
+        self.cursor = None     # 轨迹上已经处理到的位置
+        self.travel = 0.0      # 上一枚之后沿轨迹走过的距离
+        self.pending = []      # 已发射、尚未炸开的烟花
+        self.spawned = 0
+        self.dropped = 0
+        self._last = time.perf_counter()
+
+    def handle(self, event):
+        """处理鼠标事件，其余事件忽略；这里只记录，不发射"""
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            self.pressed = True
+            self.cursor = None  # 新的一笔：按下点本身就放一枚
+            self.travel = 0.0
+            self.points.append(event.pos)
+        elif event.type == pygame.MOUSEBUTTONUP:
+            self.pressed = False
+        elif event.type == pygame.MOUSEMOTION and self.pressed:
+            self.points.append(event.pos)
+
+    def emit(self, spawn, particles_in_use, cost):
+        """每帧调用一次。spawn(x, y) 发射一枚并返回烟花对象（池满时返回 None），
+        烟花对象需有 exploded 属性；cost 为每枚烟花炸开后的粒子数"""
+        now = time.perf_counter()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        self.pending = [f for f in self.pending if not f.exploded]
+        targets = self._walk(self.points)
+        self.points = []
+        for i, (x, y) in enumerate(targets):
+            if (self.tokens < 1 or
+                    particles_in_use + (len(self.pending) + 1) * cost > self.particle_budget):
+                self.dropped += len(targets) - i
+                break
+            firework = spawn(int(x), int(y))
+            if firework is None:
+                self.dropped += len(targets) - i
+                break
+            self.tokens -= 1
+            self.pending.append(firework)
+            self.spawned += 1
+
+    def _walk(self, points):
+        """沿折线每隔 spacing 取一个点；新一笔的第一个点直接取"""
+        targets = []
+        for x1, y1 in points:
+            if self.cursor is None:
+                self.cursor = (x1, y1)
+                targets.append((x1, y1))
+                continue
+            x0, y0 = self.cursor
+            remaining = math.hypot(x1 - x0, y1 - y0)
+            while self.travel + remaining >= self.spacing:
+                step = self.spacing - self.travel
+                t = step / remaining
+                x0, y0 = x0 + (x1 - x0) * t, y0 + (y1 - y0) * t
+                remaining -= step
+                self.travel = 0.0
+                targets.append((x0, y0))
+            self.travel += remaining
+            self.cursor = (x1, y1)
+        return targets
+
+    def report(self):
+        return f"鼠标烟花 发射 {self.spawned}，限流丢弃 {self.dropped}"
@@ -0,0 +1,51 @@
+import sys
+import json
+import argparse
+
+# ------------------------
+# 非交互启动：命令行或配置文件给出音乐时不弹窗，也不导入 tkinter
+# 用法：python 音乐烟花B.py --music 歌.mp3 --text 新年快乐
+#       python 音乐烟花B.py --config 晚会.json
+# 配置文件是一个 JSON 对象，键就是命令行选项名，如
+#   {"playlist": ["歌单目录"], "text": "新年快乐", "dirty": true, "quality": 0.8}
+# 展开后放在命令行参数前面，同一选项命令行优先
+# ------------------------
+def config_argv(path):
+    with open(path, encoding="utf-8-sig") as f:
+        config = json.load(f)
+    argv = []
+    for key, value in config.items():
+        option = "--" + key
+        if value is True:
+            argv.append(option)
+        elif value is False or value is None:
+            continue
+        elif isinstance(value, list):
+            argv += [option] + [str(v) for v in value]
+        else:
+            argv += [option, str(value)]
+    return argv
+
+def expand_config():
+    """把 --config 展开进 sys.argv；展开后 --config 不再出现，重复调用无副作用
+    offline_render 在 import pygame 之前就调用它，配置文件里的 "render" 也能及时关掉 pygame 的欢迎信息"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--config", default=None)
+    options, rest = parser.parse_known_args(sys.argv[1:])
+    if options.config:
+        sys.argv[1:] = config_argv(options.config) + rest
+
+def launch_args(argv=None):
+    """展开 --config 后返回 (音乐, 文字)；音乐可以是路径或只给了 --playlist 时为 None
+    既没有 --music 也没有 --playlist 时返回 None，照常弹窗。必须在其他解析命令行的模块之前调用"""
+    if argv is None:
+        expand_config()
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--music", default=None)
+    parser.add_argument("--text", default=None)
+    parser.add_argument("--playlist", nargs="+", default=None)
+    options, _ = parser.parse_known_args(argv)
+    if options.music is None and not options.playlist:
+        return None
+    return options.music, options.text
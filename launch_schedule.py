@@ -0,0 +1,50 @@
+import numpy as np
+
+# ------------------------
+# 烟花发射时间表：加载时把起音（onset）换算成发射帧
+# 火箭升空需要若干帧，发射帧 = 起音帧 - 升空帧数，烟花正好在节拍上炸开
+# 按发射帧排好序，主循环用游标依次取出到期的发射，每次 O(1)
+# ------------------------
+class LaunchSchedule:
+    def __init__(self, frames, amps, heights, size_types):
+        self.frames = frames          # 发射帧，升序
+        self.amps = amps
+        self.heights = heights        # 爆炸高度，升空帧数按它算好，发射时必须用同一个高度
+        self.size_types = size_types
+        self.next = 0
+
+    @classmethod
+    def build(cls, onset_frames, amplitude, flight_frames, threshold_large, min_amp=0.0, seed=None,
+              height_range=(400, 800), brightness=None):
+        """amplitude(帧号) 给出该帧振幅，flight_frames(amp, height) 给出火箭升到 height 需要的帧数
+        brightness(帧号) 给出 0~1 的音色明亮度时，越亮炸得越高（与随机高度各占一半）"""
+        rng = np.random.default_rng(seed)
+        heights = rng.integers(height_range[0], height_range[1] + 1, len(onset_frames)).tolist()
+        events = []
+        for frame, height in zip(np.asarray(onset_frames).tolist(), heights):
+            if brightness is not None:
+                low, high = height_range
+                height = int(round((height + high - (high - low) * brightness(frame)) / 2))
+            amp = amplitude(frame)
+            size_type = 'large' if amp >= threshold_large else 'small'
+            amp = max(amp, min_amp)  # 安静段落的节拍也要看得见
+            launch = max(0, frame - flight_frames(amp, height))
+            events.append((launch, amp, height, size_type))
+        events.sort(key=lambda e: e[0])
+        return cls([e[0] for e in events], [e[1] for e in events],
+                   [e[2] for e in events], [e[3] for e in events])
+
+    def __len__(self):
+        return len(self.frames)
+
+    def due(self, frame):
+        """取出所有发射帧 <= frame 且尚未发射的事件，返回 [(amp, height, size_type)]"""
+        start = i = self.next
+        frames = self.frames
+        while i < len(frames) and frames[i] <= frame:
+            i += 1
+        self.next = i
+        return [(self.amps[j], self.heights[j], self.size_types[j]) for j in range(start, i)]
+
+    def report(self):
+        return f"发射表 {self.next}/{len(self.frames)}"
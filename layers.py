@@ -0,0 +1,46 @@
+import pygame
+
+# ------------------------
+# 静态图层缓存：渐变背景、标题文字、雪人这类每帧都一样的图层只画一次，之后每帧一次 blit
+# 图层按目标画面的大小缓存，画面大小变化（切换全屏、改窗口大小）时自动全部重画；也可以手动 invalidate()
+# 缓存的是与原来逐帧绘制完全相同的像素，合成结果逐像素不变
+# ------------------------
+class LayerCache:
+    def __init__(self):
+        self.painters = {}
+        self.layers = {}     # 名字 -> (Surface, 左上角坐标)
+        self.size = None
+
+    def add(self, name, paint):
+        """paint(w, h) 返回 (Surface, 左上角坐标)；只在第一次使用或失效后调用"""
+        self.painters[name] = paint
+        self.layers.pop(name, None)
+
+    def invalidate(self):
+        """画面整体变化（如 set_mode 切换全屏）后调用，所有图层下次使用时重画"""
+        self.layers.clear()
+
+    def get(self, name, size):
+        if size != self.size:
+            self.layers.clear()
+            self.size = size
+        layer = self.layers.get(name)
+        if layer is None:
+            layer = self.layers[name] = self.painters[name](*size)
+        return layer
+
+    def blit(self, surface, name, offset=(0, 0)):
+        """把图层贴到 surface 上，offset 为额外的平移（如雪人晃动）"""
+        image, (x, y) = self.get(name, surface.get_size())
+        return surface.blit(image, (x + offset[0], y + offset[1]))
+
+def vertical_gradient(w, h, top_color, bottom_color):
+    """从上到下的线性渐变，每行颜色与逐行 draw.line 的画法相同"""
+    surface = pygame.Surface((w, h))
+    for y in range(h):
+        ratio = y / h
+        r = int(top_color[0] * (1-ratio) + bottom_color[0] * ratio)
+        g = int(top_color[1] * (1-ratio) + bottom_color[1] * ratio)
+        b = int(top_color[2] * (1-ratio) + bottom_color[2] * ratio)
+        pygame.draw.line(surface, (r, g, b), (0, y), (w, y))
+    return surface.convert() if pygame.display.get_surface() else surface  # 与屏幕同格式，blit 时不再转换
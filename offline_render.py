@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+from launch import expand_config
+
+# 原始帧流写到 stdout 时不能混进 pygame 的欢迎信息：本模块要在 import pygame 之前导入
+# --render 也可能写在 --config 配置文件里，先展开再判断
+expand_config()
+if "--render" in sys.argv:
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+# ------------------------
+# 离线渲染：不开窗口、不放声音，按音频时间轴逐帧推进，尽可能快地输出画面
+# 用法：python 音乐烟花B.py --render 输出目录 --music 歌曲.mp3 --text 文字
+#       python 音乐雨落B.py --render frames.raw --size 1280x720   （原始 RGB 帧流，"-" 表示 stdout）
+# ------------------------
+def parse_size(text):
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+
+def parse_render_args(argv=None):
+    """命令行带 --render 时返回选项，否则返回 None（照常弹窗、实时播放）"""
+    argv = sys.argv[1:] if argv is None else argv
+    if "--render" not in argv:
+        return None
+    parser = argparse.ArgumentParser(description="离线渲染")
+    parser.add_argument("--render", required=True, help="PNG 输出目录，.raw 文件 / - (stdout) 输出原始 RGB 帧流，none 只计时不输出")
+    parser.add_argument("--music", required=True, help="音乐文件")
+    parser.add_argument("--text", default=None, help="显示的文字，不给时用脚本默认值")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，固定后每次渲染结果相同")
+    parser.add_argument("--frames", type=int, default=None, help="最多渲染的帧数")
+    parser.add_argument("--size", type=parse_size, default=(1920, 1080), help="画面尺寸，如 1920x1080")
+    parser.add_argument("--format", choices=["png", "raw", "none"], default=None, help="默认按输出路径推断")
+    options, _ = parser.parse_known_args(argv)
+    if options.format is None:
+        if options.render == "none":
+            options.format = "none"
+        elif options.render == "-" or options.render.endswith(".raw"):
+            options.format = "raw"
+        else:
+            options.format = "png"
+    return options
+
+def setup_headless(seed):
+    """必须在 pygame.init() 之前调用"""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    random.seed(seed)
+    np.random.seed(seed)
+
+# ------------------------
+# 帧输出：编号 PNG、原始 RGB 帧流，或 none（只计数，用于跑分）
+# ------------------------
+class FrameSink:
+    def __init__(self, target, fmt="png"):
+        self.target = target
+        self.format = fmt
+        self.count = 0
+        self.start = time.perf_counter()
+        self.stream = None
+        if fmt == "png":
+            os.makedirs(target, exist_ok=True)
+        elif fmt == "raw":
+            self.stream = sys.stdout.buffer if target == "-" else open(target, 'wb')
+
+    def write(self, surface):
+        import pygame
+        if self.format == "png":
+            pygame.image.save(surface, os.path.join(self.target, "frame_%06d.png" % self.count))
+        elif self.format == "raw":
+            self.stream.write(pygame.image.tobytes(surface, "RGB"))
+        self.count += 1
+
+    def close(self):
+        elapsed = time.perf_counter() - self.start
+        if self.stream is not None and self.stream is not sys.stdout.buffer:
+            self.stream.close()
+        fps = self.count / elapsed if elapsed > 0 else 0.0
+        # 原始帧流可能写在 stdout 上，报告统一走 stderr
+        print("离线渲染 %d 帧，用时 %.2f 秒，平均 %.1f FPS" % (self.count, elapsed, fps), file=sys.stderr)
+        return fps
@@ -0,0 +1,80 @@
+import os
+import sys
+import argparse
+import contextlib
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+
+# ------------------------
+# 多进程特征提取：把解码后的 PCM 放进共享内存，按块边界切成若干段，进程池并行计算后按顺序拼接
+# 段边界总是块大小的整数倍，每块看到的数据与单进程完全相同，结果逐位一致
+# --serial（或 --workers 1）强制单进程；短曲目不值得启动进程池，也走单进程
+# ------------------------
+SEGMENT_SECONDS = 30    # 每段时长，段数远多于核数时负载更均衡
+MIN_PARALLEL_SECONDS = 90
+
+def worker_count(argv=None):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--serial", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    options, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if options.serial:
+        return 1
+    return max(1, options.workers or os.cpu_count() or 1)
+
+# 子进程里的共享内存视图
+_shared = {}
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    _shared["shm"] = shm  # 保持引用，否则映射会被回收
+    _shared["samples"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _run_segment(func, start, end, args, lookahead=0, rows=None):
+    """多带 lookahead 个采样给跨到下一段的分析帧用，结果截掉这些采样多算出的块"""
+    samples = _shared["samples"]
+    arrays = func(samples[start:min(end + lookahead, len(samples))], *args)
+    return arrays if not lookahead else tuple(a[:rows] for a in arrays)
+
+@contextlib.contextmanager
+def _hide_main_script():
+    """spawn 方式（Windows / macOS）启动的子进程会重新执行主脚本，而各场景都是没有
+    __main__ 保护的平铺脚本（会弹窗、开窗口），启动进程池期间暂时隐藏主脚本路径"""
+    main = sys.modules.get("__main__")
+    path = getattr(main, "__file__", None)
+    if path is not None:
+        del main.__file__
+    try:
+        yield
+    finally:
+        if path is not None:
+            main.__file__ = path
+
+def map_chunks(samples, chunk_size, func, args=(), frame_rate=44100, workers=None, lookahead=0):
+    """func(samples段, *args) 返回若干数组组成的元组，每个数组按块排列；返回按顺序拼接后的元组
+    func 必须定义在可导入的模块里（子进程按名字导入）
+    调用它的脚本要在弹窗、开窗口之前调用 multiprocessing.freeze_support()，否则打包后的每个子进程都会重新运行整个场景
+    每块的分析窗口超出块本身时（重叠分帧），lookahead 给出超出的采样数，分段结果仍与单进程一致"""
+    samples = np.ascontiguousarray(samples)
+    workers = worker_count() if workers is None else workers
+    segment = max(1, int(SEGMENT_SECONDS * frame_rate) // chunk_size) * chunk_size
+    bounds = [(start, min(start + segment, len(samples))) for start in range(0, len(samples), segment)]
+    if workers <= 1 or len(bounds) <= 1 or len(samples) < MIN_PARALLEL_SECONDS * frame_rate:
+        return func(samples, *args)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, samples.nbytes))
+    try:
+        np.ndarray(samples.shape, dtype=samples.dtype, buffer=shm.buf)[:] = samples
+        # 固定用 spawn：主进程已初始化 pygame / SDL，fork 出的子进程会直接崩溃，进程池随之卡死
+        context = multiprocessing.get_context("spawn")
+        with _hide_main_script():
+            pool = context.Pool(min(workers, len(bounds)), initializer=_attach,
+                                initargs=(shm.name, samples.shape, samples.dtype.str))
+        with pool:
+            parts = pool.starmap(_run_segment, [(func, start, end, args, lookahead, -(-(end - start) // chunk_size))
+                                                for start, end in bounds])
+    finally:
+        shm.close()
+        shm.unlink()
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
@@ -0,0 +1,225 @@
+import numpy as np
+import pygame
+
+# ------------------------
+# 粒子配置
+# ------------------------
+PALETTE = [
+    (255,0,0),(0,255,0),(0,0,255),
+    (255,255,0),(255,0,255),(0,255,255)
+]
+GRAVITY = 0.05
+SHRINK = 0.96
+SPARK_DX = np.array([-1, 0, -1, 0], dtype=np.int32)
+SPARK_DY = np.array([-1, -1, 0, 0], dtype=np.int32)
+
+# ------------------------
+# 圆形精灵缓存：按 (颜色, 半径) 预先画好，之后每次只做 blit
+# 精灵按目标表面的像素格式创建，黑色作透明色，贴上去的像素与 draw.circle 完全一致
+# ------------------------
+class CircleSprites:
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, color, radius, target=None):
+        key = (color, radius)
+        sprite = self.cache.get(key)
+        if sprite is None:
+            size = (2 * radius, 2 * radius)
+            sprite = pygame.Surface(size, 0, target) if target is not None else pygame.Surface(size)
+            sprite.fill((0, 0, 0))
+            pygame.draw.circle(sprite, color, (radius, radius), radius)
+            sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+            self.cache[key] = sprite
+        return sprite
+
+    def blit(self, surface, color, center, radius):
+        surface.blit(self.get(color, radius, surface), (center[0] - radius, center[1] - radius))
+
+sprites = CircleSprites()
+
+# ------------------------
+# 粒子系统：每个属性一个预分配的 NumPy 数组，所有存活粒子一次向量化更新
+# 死亡粒子的槽位进入空闲栈，下一次爆炸直接复用，运行期间不再分配内存
+# ------------------------
+class ParticleSystem:
+    def __init__(self, capacity=20000, seed=None):
+        self.capacity = capacity
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.px = np.zeros(capacity, dtype=np.float32)  # 上一步的位置，绘制时插值用
+        self.py = np.zeros(capacity, dtype=np.float32)
+        self.dx = np.zeros(capacity, dtype=np.float32)
+        self.dy = np.zeros(capacity, dtype=np.float32)
+        self.color = np.zeros(capacity, dtype=np.uint8)
+        self.lifetime = np.zeros(capacity, dtype=np.int32)
+        self.size = np.zeros(capacity, dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int32)  # 空闲槽位栈，栈顶在 free_top-1
+        self.free_top = capacity
+        self.high = 0  # 槽位使用上界，更新只扫描 [0, high)
+        self.peak = 0
+        self.rng = np.random.default_rng(seed)
+        self._sprites = None
+
+    def __len__(self):
+        return self.capacity - self.free_top
+
+    def emit(self, x, y, count, speed_base, size):
+        """在 (x, y) 处炸开 count 个粒子，返回其中最长的寿命（帧）；池满时按剩余槽位截断"""
+        count = min(count, self.free_top)
+        if count <= 0:
+            return 0
+        slots = self.free[self.free_top - count:self.free_top]
+        self.free_top -= count
+        angle = self.rng.uniform(0, 2 * np.pi, count)
+        speed = self.rng.uniform(speed_base, speed_base + 5, count)
+        self.x[slots] = self.px[slots] = x
+        self.y[slots] = self.py[slots] = y
+        self.dx[slots] = speed * np.cos(angle)
+        self.dy[slots] = speed * np.sin(angle)
+        self.color[slots] = self.rng.integers(0, len(PALETTE), count)
+        self.lifetime[slots] = (self.rng.integers(40, 81, count) * 1.2).astype(np.int32)
+        self.size[slots] = size
+        self.alive[slots] = True
+        self.high = max(self.high, int(slots.max()) + 1)
+        self.peak = max(self.peak, len(self))
+        return int(self.lifetime[slots].max())
+
+    def update(self):
+        h = self.high
+        if h == 0:
+            return
+        self.px[:h] = self.x[:h]
+        self.py[:h] = self.y[:h]
+        self.x[:h] += self.dx[:h]
+        self.y[:h] += self.dy[:h]
+        self.dy[:h] += GRAVITY
+        self.lifetime[:h] -= 1
+        self.size[:h] *= SHRINK
+
+        # 回收本帧死亡的槽位
+        dead = np.flatnonzero(self.alive[:h] & (self.lifetime[:h] <= 0))
+        if dead.size:
+            self.alive[dead] = False
+            self.free[self.free_top:self.free_top + dead.size] = dead
+            self.free_top += dead.size
+            if self.free_top == self.capacity:
+                # 全部空闲时重排空闲栈，让后续爆炸从低位槽开始占用
+                self.free[:] = np.arange(self.capacity - 1, -1, -1, dtype=np.int32)
+                self.high = 0
+            else:
+                self.high = int(np.flatnonzero(self.alive[:h])[-1]) + 1
+
+    def _screen_positions(self, alpha):
+        """存活粒子的下标、绘制圆心和半径；alpha 为固定步长模拟的插值系数，1 表示直接取当前位置"""
+        idx = np.flatnonzero(self.alive[:self.high])
+        if alpha == 1.0:
+            xs = self.x[idx].astype(np.int32)
+            ys = self.y[idx].astype(np.int32)
+        else:
+            px, py = self.px[idx], self.py[idx]
+            xs = (px + (self.x[idx] - px) * alpha).astype(np.int32)
+            ys = (py + (self.y[idx] - py) * alpha).astype(np.int32)
+        rs = np.maximum(1, self.size[idx].astype(np.int32))
+        return idx, xs, ys, rs
+
+    def bounds(self, alpha=1.0):
+        """本帧每个粒子占用的矩形 (x0, y0, x1, y1)，含端点，脏矩形渲染用"""
+        _, xs, ys, rs = self._screen_positions(alpha)
+        return xs - rs, ys - rs, xs + rs, ys + rs
+
+    def draw(self, surface, alpha=1.0):
+        idx, xs, ys, rs = self._screen_positions(alpha)
+        if idx.size == 0:
+            return
+        cs = self.color[idx]
+        if rs.max() == 1 and surface.get_bytesize() == 4:
+            self._draw_sparks(surface, xs, ys, cs)
+            return
+        # 按槽位顺序一次 blits，遮挡关系与逐个 draw.circle 相同
+        table = self._sprite_table(int(rs.max()), surface)
+        positions = zip((xs - rs).tolist(), (ys - rs).tolist())
+        surface.blits(zip(table[cs, rs].tolist(), positions), doreturn=False)
+
+    def _sprite_table(self, max_radius, surface):
+        """(颜色下标, 半径) -> 精灵 的对象数组，用 NumPy 花式索引一次取出本帧所有精灵"""
+        table = self._sprites
+        if table is None or table.shape[1] <= max_radius:
+            size = max(max_radius + 1, 16 if table is None else 2 * table.shape[1])
+            table = np.empty((len(PALETTE), size), dtype=object)
+            for c, color in enumerate(PALETTE):
+                for r in range(1, size):
+                    table[c, r] = sprites.get(color, r, surface)
+            self._sprites = table
+        return table
+
+    def _draw_sparks(self, surface, xs, ys, cs):
+        """全部粒子半径为 1 时（draw.circle 画成左上方 2x2 的方块），直接写入像素数组"""
+        w, h = surface.get_size()
+        colors = np.array([surface.map_rgb(c) for c in PALETTE], dtype=np.uint32)[cs]
+        # 每个粒子的 4 个像素连续排列，保证后画的粒子覆盖先画的
+        px = (xs[:, None] + SPARK_DX).ravel()
+        py = (ys[:, None] + SPARK_DY).ravel()
+        colors = np.repeat(colors, 4)
+        inside = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+        pixels = pygame.surfarray.pixels2d(surface)
+        pixels[px[inside], py[inside]] = colors[inside]
+        del pixels  # 释放表面锁
+
+    def report(self):
+        return f"粒子池 {len(self)}/{self.capacity}（峰值 {self.peak}）"
+
+# ------------------------
+# 发射器对象池：预先创建 capacity 个对象，用空闲栈复用已结束的槽位
+# 对象需实现 reset(...)、update()、draw(surface)、is_dead()
+# ------------------------
+class EmitterPool:
+    def __init__(self, factory, capacity):
+        self.capacity = capacity
+        self.items = [factory() for _ in range(capacity)]
+        self.free = list(range(capacity - 1, -1, -1))
+        self.active = []
+        self.budget = capacity  # 同时活动的上限，可由画质调节器压低
+        self.peak = 0
+
+    def __len__(self):
+        return len(self.active)
+
+    def __iter__(self):
+        items = self.items
+        return (items[i] for i in self.active)
+
+    def spawn(self, *args, **kwargs):
+        """取一个空闲槽位重置后启用；池已满或超出 budget 时返回 None"""
+        if not self.free or len(self.active) >= self.budget:
+            return None
+        i = self.free.pop()
+        item = self.items[i]
+        item.reset(*args, **kwargs)
+        self.active.append(i)
+        self.peak = max(self.peak, len(self.active))
+        return item
+
+    def update(self):
+        items = self.items
+        active = self.active
+        for i in active:
+            items[i].update()
+        # 原地压缩活动列表，已结束的槽位放回空闲栈
+        j = 0
+        for i in active:
+            if items[i].is_dead():
+                self.free.append(i)
+            else:
+                active[j] = i
+                j += 1
+        del active[j:]
+
+    def draw(self, surface, *args):
+        items = self.items
+        for i in self.active:
+            items[i].draw(surface, *args)
+
+    def report(self):
+        return f"烟花池 {len(self)}/{self.capacity}（峰值 {self.peak}）"
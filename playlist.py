@@ -0,0 +1,82 @@
+import os
+import sys
+import argparse
+import threading
+
+# ------------------------
+# 播放列表：一晚上连续放多首歌，场景（粒子、雪层等）不重置
+# 当前曲目播放时，后台线程已在解码、分析下一首，切歌时直接取结果，没有加载卡顿
+# 用法：python 音乐烟花B.py --playlist 歌单目录 或 a.mp3 b.mp3 或 歌单.m3u（可混用）
+# ------------------------
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".m4a")
+
+def expand(entries):
+    """文件原样保留，目录按文件名排序展开，.m3u / .m3u8 按行读取（# 开头为注释，相对路径相对列表文件）"""
+    paths = []
+    for entry in entries:
+        if os.path.isdir(entry):
+            paths += [os.path.join(entry, name) for name in sorted(os.listdir(entry))
+                      if name.lower().endswith(AUDIO_EXTENSIONS)]
+        elif entry.lower().endswith((".m3u", ".m3u8")):
+            base = os.path.dirname(os.path.abspath(entry))
+            with open(entry, encoding="utf-8-sig") as f:
+                lines = [line.strip() for line in f]
+            paths += [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+        else:
+            paths.append(entry)
+    return paths
+
+def playlist_paths(selected, argv=None):
+    """--playlist 给出时用它，否则用弹窗 / --music 选中的文件（单个路径或多选的路径列表）"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--playlist", nargs="+", default=None)
+    options, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if options.playlist:
+        return expand(options.playlist)
+    return [selected] if isinstance(selected, str) else list(selected)
+
+class _Prefetch(threading.Thread):
+    """在后台线程里执行 prepare(path)；解码走 ffmpeg 子进程，分析以 numpy 为主，基本不占主线程"""
+    def __init__(self, prepare, path):
+        super().__init__(daemon=True)  # 中途退出时不等待未完成的分析
+        self.prepare = prepare
+        self.path = path
+        self.result = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.result = self.prepare(self.path)
+        except Exception as e:
+            self.error = e
+
+class Playlist:
+    def __init__(self, paths, prepare):
+        """prepare(path) 解码并分析一首歌，返回值原样交给主循环"""
+        self.paths = list(paths)
+        self.prepare = prepare
+        self.index = -1
+
+    @classmethod
+    def from_argv(cls, selected, prepare, argv=None):
+        return cls(playlist_paths(selected, argv), prepare)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        """依次产出每首歌的 prepare 结果；产出第 N 首时，第 N+1 首已在后台开始分析"""
+        pending = _Prefetch(self.prepare, self.paths[0]) if self.paths else None
+        for i, path in enumerate(self.paths):
+            pending.join()
+            done = pending
+            pending = _Prefetch(self.prepare, self.paths[i + 1]) if i + 1 < len(self.paths) else None
+            if done.error is not None:
+                print(f"跳过无法播放的曲目 {path}: {done.error}", file=sys.stderr)
+                continue
+            self.index = i
+            yield done.result
+
+    def report(self):
+        return f"曲目 {self.index + 1}/{len(self.paths)}"
@@ -0,0 +1,61 @@
+import sys
+import random
+import argparse
+
+# ------------------------
+# 自适应画质：根据最近的帧耗时（不含等待时钟）自动升降画质等级 0.2~1.0
+# 场景用 scale() 缩放容量上限（烟花池、雨滴上限），用 count() 缩放每次生成的数量（粒子、雨滴、水花圈、雪花）
+# --quality 0.5 固定等级、关闭自适应；离线渲染默认固定 1.0，保证结果可复现
+# ------------------------
+class QualityGovernor:
+    def __init__(self, target_fps=60, level=1.0, adaptive=True, min_level=0.2,
+                 step_down=0.85, step_up=0.05, cooldown=30):
+        self.budget_ms = 1000 / target_fps
+        self.level = level
+        self.adaptive = adaptive
+        self.min_level = min_level
+        self.step_down = step_down  # 超预算时乘以该系数，降得快
+        self.step_up = step_up      # 有富余时加上该值，升得慢
+        self.cooldown = cooldown    # 两次调整之间至少间隔的帧数，等新等级的效果体现出来
+        self.work_ms = None         # 帧耗时的指数滑动平均
+        self._wait = cooldown
+
+    @classmethod
+    def from_argv(cls, target_fps, render=False, argv=None):
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument("--quality", type=float, default=None)
+        options, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+        if options.quality is not None:
+            return cls(target_fps, level=options.quality, adaptive=False)
+        return cls(target_fps, adaptive=not render)
+
+    def update(self, work_ms):
+        """每帧调用一次，work_ms 为上一帧实际工作耗时"""
+        if not self.adaptive or not work_ms:
+            return
+        self.work_ms = work_ms if self.work_ms is None else 0.9 * self.work_ms + 0.1 * work_ms
+        if self._wait > 0:
+            self._wait -= 1
+            return
+        if self.work_ms > 0.85 * self.budget_ms and self.level > self.min_level:
+            self.level = max(self.min_level, self.level * self.step_down)
+            self._wait = self.cooldown
+        elif self.work_ms < 0.6 * self.budget_ms and self.level < 1.0:
+            self.level = min(1.0, self.level + self.step_up)
+            self._wait = self.cooldown
+
+    def scale(self, n, minimum=1):
+        """缩放容量上限"""
+        return max(minimum, int(round(n * self.level)))
+
+    def count(self, n):
+        """缩放生成数量；小数部分按概率取整，低画质下每帧 1 片雪花也能按比例减少"""
+        scaled = n * self.level
+        whole = int(scaled)
+        if scaled > whole and random.random() < scaled - whole:
+            whole += 1
+        return whole
+
+    def label(self):
+        mode = "自适应" if self.adaptive else "固定"
+        return "画质 %d%%（%s）" % (round(self.level * 100), mode)
@@ -0,0 +1,128 @@
+import numpy as np
+import pygame
+
+# ------------------------
+# 雨滴场：每个属性一个预分配的 NumPy 数组，前 count 个槽位是在场的雨滴
+# 下落、落地判定、重生、选出溅起水花的雨滴都是整批向量化运算；绘制时把所有雨滴的像素一次写入
+# 雨滴数量由每帧的目标值决定：不足时在末尾补齐，超出时截掉末尾（与原来 rain[:target] 相同）
+# 每个槽位的长度、速度、粗细在创建时就随机定好（原来雨滴落地重生时也保留这三项），
+# 同长度同粗细的槽位预先分好组，绘制时每组一次广播就能算出全部像素位置
+# ------------------------
+GROUND_OFFSET = 60   # 落地线距底边的距离，水花也画在这条线上
+LIGHT_RATIO = 0.6    # 细雨滴（短、慢、1 像素宽）的比例，其余为粗雨滴
+
+class RainField:
+    def __init__(self, capacity, seed=None):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        light = rng.random(capacity) < LIGHT_RATIO
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.py = np.zeros(capacity, dtype=np.float32)  # 上一步的位置，绘制时插值用
+        self.length = np.where(light, rng.integers(8, 16, capacity), rng.integers(15, 31, capacity)).astype(np.int32)
+        self.speed = np.where(light, rng.uniform(3, 6, capacity), rng.uniform(7, 15, capacity)).astype(np.float32)
+        self.thickness = np.where(light, 1, 2).astype(np.int32)
+        # 按 (长度, 粗细) 分组的槽位号，组内升序，取前 count 个槽位只需一次 searchsorted
+        key = self.length * 2 + self.thickness
+        order = np.argsort(key, kind="stable")
+        self.groups = np.split(order, np.flatnonzero(np.diff(key[order])) + 1)
+        self._offsets = (None, None)  # (每行像素数, 每组的像素偏移)，随目标表面的 pitch 变化
+        self.count = 0
+        self.peak = 0
+
+    def __len__(self):
+        return self.count
+
+    def rain_x(self, low_energy, high_energy, w, n):
+        """n 个雨滴的 x 坐标：低频集中在中间，高频散开"""
+        ratio = low_energy / (low_energy + high_energy + 1e-6)
+        center = int(w * 0.5)
+        spread = int(w * (0.2 + 0.5*(1-ratio)))  # 低频集中, spread小，高频稀疏
+        return self.rng.integers(max(0, center - spread), min(w, center + spread) + 1, n)
+
+    def spawn(self, n, w, h, low_energy, high_energy):
+        """在末尾补 n 个新雨滴（从画面上方随机高度落下）；容量用完时截断"""
+        n = min(n, self.capacity - self.count)
+        if n <= 0:
+            return
+        s = slice(self.count, self.count + n)
+        self.x[s] = self.rain_x(low_energy, high_energy, w, n)
+        self.y[s] = self.py[s] = self.rng.integers(-h, 1, n)
+        self.count += n
+        self.peak = max(self.peak, self.count)
+
+    def resize(self, target, w, h, low_energy, high_energy):
+        """把雨滴数量调整到 target：多了截掉末尾，少了在末尾补齐"""
+        target = min(target, self.capacity)
+        if target < self.count:
+            self.count = target
+        else:
+            self.spawn(target - self.count, w, h, low_energy, high_energy)
+
+    def update(self, h, w, norm_energy, low_energy, high_energy):
+        """前进一步，返回本步溅起水花的雨滴 x 坐标；落地的雨滴回到顶部附近重新落下"""
+        n = self.count
+        y = self.y[:n]
+        self.py[:n] = y
+        y += self.speed[:n] * (1 + norm_energy * 1.5)
+        landed = np.flatnonzero(y > h - GROUND_OFFSET)
+        if len(landed) == 0:
+            return self.x[landed]
+        # 水花概率：低音比例越高，水花越多
+        low_ratio = low_energy / (low_energy + high_energy + 1e-6)
+        rng = self.rng
+        splash_x = self.x[landed[rng.random(len(landed)) < 0.5 + 0.5 * low_ratio]]
+        self.y[landed] = self.py[landed] = rng.integers(-30, 1, len(landed))
+        self.x[landed] = self.rain_x(low_energy, high_energy, w, len(landed))
+        return splash_x
+
+    def _group_offsets(self, stride):
+        """每组一个雨滴的像素相对起点的一维偏移：竖直 length+1 行（含两端），粗雨滴每行再加右侧一列，与 draw.line 相同"""
+        if self._offsets[0] != stride:
+            offsets = []
+            for group in self.groups:
+                rows = np.arange(self.length[group[0]] + 1) * stride
+                offsets.append((rows[:, None] + np.arange(self.thickness[group[0]])).ravel())
+            self._offsets = (stride, offsets)
+        return self._offsets[1]
+
+    def draw(self, surface, color, alpha=1.0):
+        """所有雨滴一次写入像素（32 位表面）"""
+        n = self.count
+        if n == 0:
+            return
+        w, h = surface.get_size()
+        y = self.y[:n] - (self.y[:n] - self.py[:n]) * (1 - alpha)  # 固定步长插值，alpha=1 时正好是当前位置
+        x, length, thickness = self.x[:n], self.length[:n], self.thickness[:n]
+        # 两端各自取整（向零截断），与 draw.line((x, int(y)), (x, int(y + length))) 相同；
+        # y 为负的小数时两端截断方向不同，竖直跨度会比 length 少一行，这类雨滴走下面的逐像素路径
+        top = y.astype(np.int32)
+        bottom = (y + length).astype(np.int32)
+        inside = (top >= 0) & (bottom - top == length) & (bottom < h) & (x + thickness <= w)
+        stride = surface.get_pitch() // 4
+        start = top.astype(np.int64) * stride + x
+        mapped = surface.map_rgb(color)
+        pixels = pygame.surfarray.pixels2d(surface)
+        flat = np.lib.stride_tricks.as_strided(pixels, shape=(stride * h,), strides=(4,))  # 按行排列的一维视图
+        # 完全在画面内的雨滴：按组广播出全部像素位置，不需要逐像素裁剪
+        for group, offsets in zip(self.groups, self._group_offsets(stride)):
+            group = group[:np.searchsorted(group, n)]
+            group = group[inside[group]]
+            flat[(start[group][:, None] + offsets).ravel()] = mapped
+        # 跨出画面边缘的少数雨滴：逐像素展开后裁剪
+        edge = np.flatnonzero(~inside & (bottom >= 0) & (top < h) & (x < w))
+        if len(edge):
+            runs = bottom[edge] - top[edge] + 1
+            first = np.repeat(np.cumsum(runs) - runs, runs)
+            px = np.repeat(x[edge], runs)
+            py = np.repeat(top[edge], runs) + np.arange(first.size, dtype=np.int32) - first
+            thick = np.repeat(thickness[edge] == 2, runs)
+            px = np.concatenate((px, px[thick] + 1))
+            py = np.concatenate((py, py[thick]))
+            ok = (px < w) & (py >= 0) & (py < h)
+            pixels[px[ok], py[ok]] = mapped
+        del flat, pixels  # 释放表面锁
+
+    def report(self):
+        return f"雨滴 {self.count}/{self.capacity}（峰值 {self.peak}）"
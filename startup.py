@@ -0,0 +1,52 @@
+import sys
+import time
+
+# ------------------------
+# 启动耗时报告：--startup-report 时，第一帧画完后把各阶段耗时打印到 stderr
+# 脚本的第一条 import 就是本模块，从这一刻开始计时；装有 psutil 时还会算出此前解释器自身的启动时间
+# （PyInstaller 打包版要先把整个程序解压到 _MEIPASS，这一段往往最长）
+# ------------------------
+_START = time.perf_counter()
+_START_WALL = time.time()
+
+def _process_ms():
+    """进程创建到导入本模块的毫秒数，没有 psutil 时为 None"""
+    try:
+        import psutil
+        return (_START_WALL - psutil.Process().create_time()) * 1000
+    except Exception:
+        return None
+
+class StartupTimer:
+    def __init__(self):
+        self.marks = []
+        self.done = False
+        self._last = _START
+
+    def mark(self, name):
+        """记下从上一个 mark 到现在的耗时"""
+        if self.done:
+            return
+        now = time.perf_counter()
+        self.marks.append((name, (now - self._last) * 1000))
+        self._last = now
+
+    def report(self):
+        """主循环每帧调用；只在第一次调用时生效（此时第一帧已经画完）"""
+        if self.done:
+            return
+        self.mark("第一帧")
+        self.done = True
+        if "--startup-report" not in sys.argv:
+            return
+        lines = []
+        before = _process_ms()
+        if before is not None:
+            lines.append(("解释器启动", before))
+        lines += self.marks
+        total = sum(ms for _, ms in lines)
+        print("启动耗时 %.0f ms" % total, file=sys.stderr)
+        for name, ms in lines:
+            print("  %-10s %7.1f ms  %5.1f%%" % (name, ms, 100 * ms / total if total else 0), file=sys.stderr)
+
+startup = StartupTimer()
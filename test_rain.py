@@ -0,0 +1,48 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import numpy as np
+import pygame
+
+from rain import RainField
+
+# ------------------------
+# RainField.draw 必须与逐个雨滴 pygame.draw.line 的结果逐像素相同
+# 包括 y 为负的小数（两端截断方向不同）、跨出左右和上下边缘的雨滴
+# ------------------------
+W, H = 320, 200
+COLOR = (180, 200, 255)
+
+def reference(field, alpha=1.0):
+    surface = pygame.Surface((W, H), 0, 32)
+    n = field.count
+    for x, y, py, length, thickness in zip(field.x[:n], field.y[:n], field.py[:n],
+                                           field.length[:n], field.thickness[:n]):
+        y = float(y - (y - py) * (1 - alpha))
+        pygame.draw.line(surface, COLOR, (int(x), int(y)), (int(x), int(y + length)), int(thickness))
+    return pygame.surfarray.array2d(surface)
+
+def vectorized(field, alpha=1.0):
+    surface = pygame.Surface((W, H), 0, 32)
+    field.draw(surface, COLOR, alpha)
+    return pygame.surfarray.array2d(surface)
+
+def make_field(y, seed=1):
+    field = RainField(len(y), seed=seed)
+    field.count = len(y)
+    field.x[:] = field.rng.integers(0, W, len(y))
+    field.y[:] = field.py[:] = y
+    return field
+
+def test_negative_fractional_y():
+    rng = np.random.default_rng(0)
+    y = rng.uniform(-40, 5, 3000)
+    field = make_field(y)
+    assert np.array_equal(vectorized(field), reference(field))
+
+def test_edges_and_interpolation():
+    rng = np.random.default_rng(1)
+    y = rng.uniform(-H, H + 10, 3000)
+    field = make_field(y, seed=2)
+    field.x[:20] = W - 1  # 粗雨滴右侧一列在画面外
+    field.py[:] = field.y - rng.uniform(0, 15, 3000)
+    assert np.array_equal(vectorized(field, 0.37), reference(field, 0.37))
@@ -0,0 +1,37 @@
+import time
+
+# ------------------------
+# 固定步长模拟：物理按固定的 1/rate 秒推进，与渲染帧率脱钩
+# 每帧把实际经过的时间放进累加器，按整步消耗；渲染掉帧时一帧内补跑多步，
+# 但最多 max_steps 步，超出部分直接丢弃，避免越补越慢
+# 剩余不足一步的时间给出插值系数 alpha，绘制时在上一步和当前步的位置之间插值
+# ------------------------
+class FixedTimestep:
+    def __init__(self, rate=60, max_steps=5, interpolate=True):
+        self.dt = 1 / rate
+        self.max_steps = max_steps
+        self.interpolate = interpolate
+        self.accumulator = 0.0
+        self.dropped = 0  # 因超出补帧上限而丢弃的步数
+        self._last = None
+
+    def advance(self, elapsed=None):
+        """返回本帧应模拟的步数；elapsed 为 None 时按真实时间计，离线渲染时传入固定的帧间隔"""
+        if elapsed is None:
+            now = time.perf_counter()
+            elapsed = self.dt if self._last is None else now - self._last
+            self._last = now
+        self.accumulator += elapsed
+        steps = int(self.accumulator / self.dt)
+        self.accumulator -= steps * self.dt
+        if steps > self.max_steps:
+            self.dropped += steps - self.max_steps
+            steps = self.max_steps
+        return steps
+
+    @property
+    def alpha(self):
+        """绘制位置 = 上一步 + (当前步 - 上一步) * alpha（落后至多一步，换来平滑）；不插值时恒为 1，直接画当前步"""
+        if not self.interpolate:
+            return 1.0
+        return self.accumulator / self.dt
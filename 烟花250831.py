@@ -1,8 +1,21 @@
+from startup import startup  # 第一条 import：启动耗时从这里开始计
+from offline_render import parse_render_args, setup_headless, FrameSink
 import pygame
 import sys
 import random
 import numpy as np
-from pydub import AudioSegment
+from particles import ParticleSystem, EmitterPool, sprites
+from audio_analysis import load_audio, load_envelope, load_onsets, preload_audio, configure_ffmpeg
+from analysis_cache import AnalysisCache
+from frame_timing import FrameTimer
+from quality import QualityGovernor
+from timestep import FixedTimestep
+from launch_schedule import LaunchSchedule
+from audio_clock import OfflineClock, play_decoded
+from playlist import Playlist, playlist_paths
+from launch import launch_args
+from dirty_rects import DirtyRects
+startup.mark("导入模块")
 
 # ------------------------
 # 配置
@@ -15,16 +28,33 @@ TEXT_COLOR = (255, 255, 255)
 TEXT_ALPHA = 128
 TEXT_FONT_SIZE = 96
 TEXT_POS_RATIO = (0.5, 0.25)
-MAX_FIREWORKS = 30
+MAX_FIREWORKS = 30       # 烟花池容量（含鼠标烟花），池满时不再发射
+MAX_PARTICLES = 20000    # 粒子池容量
 
 THRESHOLD_LARGE = 5.0  # 大烟花振幅阈值
-THRESHOLD_SMALL = 1.0  # 小烟花振幅阈值
+THRESHOLD_SMALL = 1.0  # 小烟花振幅下限：安静段落的节拍也按此振幅发射
+
+LAUNCH = launch_args()        # --music / --playlist / --config 可以换掉上面写死的音乐和文字
+RENDER = parse_render_args()  # --render 时离线渲染
+if RENDER:
+    setup_headless(RENDER.seed)
+    WIDTH, HEIGHT = RENDER.size
+    MUSIC_FILE = RENDER.music
+    TEXT = RENDER.text or TEXT
+elif LAUNCH:
+    MUSIC_FILE = LAUNCH[0] or MUSIC_FILE
+    TEXT = LAUNCH[1] or TEXT
 
 # ------------------------
 # ffmpeg 配置（pydub）
 # ------------------------
-AudioSegment.converter = r"C:\ffmpeg\bin\ffmpeg.exe"
-AudioSegment.ffprobe = r"C:\ffmpeg\bin\ffprobe.exe"
+configure_ffmpeg(r"C:\ffmpeg\bin\ffmpeg.exe", r"C:\ffmpeg\bin\ffprobe.exe")  # pydub 到真正解码时才导入
+
+startup.mark("选择音乐")
+# 选好音乐后立即在后台解码第一首，与 pygame 初始化、建窗口、加载字体同时进行
+cache = AnalysisCache()
+for path in playlist_paths(MUSIC_FILE)[:1]:
+    preload_audio(path, cache)
 
 # ------------------------
 # 初始化
@@ -32,6 +62,7 @@ AudioSegment.ffprobe = r"C:\ffmpeg\bin\ffprobe.exe"
 pygame.init()
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("音乐烟花秀")
+startup.mark("初始化窗口")
 clock = pygame.time.Clock()
 
 font = pygame.font.SysFont("Microsoft YaHei", TEXT_FONT_SIZE, bold=True)
@@ -40,55 +71,35 @@ text_surface = text_surface.convert_alpha()
 text_surface.set_alpha(TEXT_ALPHA)
 text_rect = text_surface.get_rect(center=(int(WIDTH*TEXT_POS_RATIO[0]), int(HEIGHT*TEXT_POS_RATIO[1])))
 
-pygame.mixer.init()
-pygame.mixer.music.load(MUSIC_FILE)
-pygame.mixer.music.play()
-
 # ------------------------
 # 烟花类
 # ------------------------
-class Particle:
-    def __init__(self, x, y, dx, dy, color, lifetime, size):
-        self.x = x
-        self.y = y
-        self.dx = dx
-        self.dy = dy
-        self.color = color
-        self.lifetime = lifetime
-        self.size = size
-
-    def update(self):
-        self.x += self.dx
-        self.y += self.dy
-        self.dy += 0.05
-        self.lifetime -= 1
-        self.size *= 0.96
-
-    def draw(self, surface):
-        if self.lifetime > 0:
-            pygame.draw.circle(surface, self.color,
-                               (int(self.x), int(self.y)),
-                               max(1, int(self.size)))
+particles = ParticleSystem(MAX_PARTICLES, seed=RENDER.seed if RENDER else None)
+quality = QualityGovernor.from_argv(FPS, render=bool(RENDER))  # 帧耗时超预算时自动减少粒子和烟花数量
 
 class Firework:
-    def __init__(self, amp=1.0, size_type='small'):
-        self.x = random.randint(200, WIDTH - 200)
+    def __init__(self, amp=1.0, size_type='small', height=None):
+        self.reset(amp, size_type, height)
+
+    def reset(self, amp=1.0, size_type='small', height=None):
+        margin = min(200, WIDTH // 4)  # 画面宽度不足 400 时收窄左右边距
+        self.x = random.randint(margin, WIDTH - margin)
         self.y = HEIGHT
-        self.height = random.randint(400, 800)
+        self.prev_y = self.y
+        self.height = height if height is not None else random.randint(400, 800)
         self.exploded = False
-        self.particles = []
+        self.life = 0
         self.amp = amp
         self.size_type = size_type
 
     def update(self):
         if not self.exploded:
+            self.prev_y = self.y
             self.y -= 10 + self.amp*5
             if self.y <= self.height:
                 self.explode()
         else:
-            for p in self.particles:
-                p.update()
-            self.particles = [p for p in self.particles if p.lifetime > 0]
+            self.life -= 1
 
     def explode(self):
         self.exploded = True
@@ -99,93 +110,145 @@ class Firework:
             particle_count = 60
             speed_base = 2
 
-        for _ in range(particle_count):
-            angle = random.uniform(0, 2 * np.pi)
-            speed = random.uniform(speed_base, speed_base + 5)
-            dx = speed * np.cos(angle)
-            dy = speed * np.sin(angle)
-            color = random.choice([
-                (255, 0, 0), (0, 255, 0), (0, 0, 255),
-                (255, 255, 0), (255, 0, 255), (0, 255, 255)
-            ])
-            lifetime = int(random.randint(40, 80) * 1.2)
-            size = (2 + self.amp*3)*0.6
-            self.particles.append(Particle(self.x, self.y, dx, dy, color, lifetime, size))
-
-    def draw(self, surface):
+        size = (2 + self.amp*3)*0.6
+        self.life = particles.emit(self.x, self.y, quality.count(particle_count), speed_base, size)
+
+    def head(self, alpha=1.0):
+        """火箭头的绘制圆心和半径；固定步长插值，alpha=1 时正好是当前位置"""
+        y = self.y - (self.y - self.prev_y) * (1 - alpha)
+        return (int(self.x), int(y)), max(3, int(4*self.amp*0.6))
+
+    def draw(self, surface, alpha=1.0):
         if not self.exploded:
-            pygame.draw.circle(surface, (255, 255, 255),
-                               (int(self.x), int(self.y)),
-                               max(3, int(4*self.amp*0.6)))
-        else:
-            for p in self.particles:
-                p.draw(surface)
+            sprites.blit(surface, (255, 255, 255), *self.head(alpha))
+
+    def is_dead(self):
+        return self.exploded and self.life <= 0
 
 # ------------------------
 # 音乐振幅分析（安全RMS）
 # ------------------------
-audio = AudioSegment.from_mp3(MUSIC_FILE)
-samples = np.array(audio.get_array_of_samples())
-if audio.channels > 1:
-    samples = samples.reshape((-1, audio.channels))
-left_channel = samples[:,0]
-
-SAMPLES_PER_FRAME = int(audio.frame_rate / FPS)
-TOTAL_FRAMES = int(len(left_channel) / SAMPLES_PER_FRAME)
-
-def get_amplitude(frame):
-    start = frame * SAMPLES_PER_FRAME
-    end = start + SAMPLES_PER_FRAME
-    if start >= len(left_channel):
-        return 0
-    end = min(end, len(left_channel))
-    slice_data = left_channel[start:end]
-    if slice_data.size == 0:
-        return 0
-    slice_data = slice_data.astype(np.float32)
-    mean_sq = np.mean(slice_data**2)
-    if mean_sq <= 0:
-        return 0
-    return np.sqrt(mean_sq) / 1000
+def flight_frames(amp, height):
+    """火箭从屏幕底部升到 height 的帧数，与 Firework.update 的上升速度一致（发射当帧已上升一步）"""
+    return max(0, int(np.ceil((HEIGHT - height) / (10 + amp*5))) - 1)
+
+def prepare_track(path):
+    """解码并分析一首歌：振幅包络 + 起音发射表（火箭提前升空，正好在节拍上炸开）
+    播放列表模式下在后台线程里运行，只做计算，不碰 pygame"""
+    audio = load_audio(path, cache)  # 缓存命中时直接映射 PCM，振幅和起音分析共用，只解码一次
+    envelope = load_envelope(path, FPS, cache, audio=audio)
+    onset_frames, _ = load_onsets(path, FPS, cache, audio=audio)
+
+    def get_amplitude(frame):
+        return envelope.at(frame) / 1000
+
+    schedule = LaunchSchedule.build(onset_frames, get_amplitude, flight_frames, THRESHOLD_LARGE,
+                                    min_amp=THRESHOLD_SMALL, seed=RENDER.seed if RENDER else None)
+    return path, audio, len(envelope), schedule
+
+# 播放列表（--playlist；未给出时只有选中的这一首）：播放当前曲目时，后台已在分析下一首
+tracks = iter(Playlist.from_argv(MUSIC_FILE, prepare_track))
+
+def next_track():
+    """取出下一首并开始播放，返回 (总帧数, 发射表, 音频时钟)；列表放完时返回 None"""
+    track = next(tracks, None)
+    if track is None:
+        return None
+    path, audio, total_frames, schedule = track
+    # 离线渲染时每首歌的时钟都从第 0 帧算起，帧输出照常接续
+    return total_frames, schedule, OfflineClock(FPS) if RENDER else play_decoded(audio)
+
+if RENDER:
+    frame_sink = FrameSink(RENDER.render, RENDER.format)
 
 # ------------------------
 # 主循环
 # ------------------------
-fireworks = []
-frame_count = 0
+fireworks = EmitterPool(Firework, MAX_FIREWORKS)
+timer = FrameTimer.from_argv()
+dirty = DirtyRects.from_argv()  # --dirty：只重画有变化的区域
+stepper = FixedTimestep(FPS, interpolate=not RENDER)  # 离线渲染每帧正好一步，不插值
 running = True
-
-while running and frame_count < TOTAL_FRAMES:
+startup.mark("加载字体与场景")
+# 分析全部完成、即将进入主循环时才开始播放，第一帧就与声音对齐
+current = next_track()
+if current is None:
+    sys.exit("没有可播放的音乐")
+TOTAL_FRAMES, schedule, audio_clock = current
+startup.mark("等待解码与分析")
+
+while running:
+    timer.start()
+    quality.update(timer.last_work_ms())
+    fireworks.budget = quality.scale(MAX_FIREWORKS)
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
         elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
             running = False
-
-    screen.fill((0, 0, 0))
-
-    amp = get_amplitude(frame_count)
-
-    # 根据振幅触发烟花
-    if amp >= THRESHOLD_LARGE and len(fireworks) < MAX_FIREWORKS:
-        fireworks.append(Firework(amp=amp, size_type='large'))
-    elif amp >= THRESHOLD_SMALL and len(fireworks) < MAX_FIREWORKS:
-        fireworks.append(Firework(amp=amp, size_type='small'))
-
-    for fw in fireworks:
-        fw.update()
-        fw.draw(screen)
-    fireworks = [fw for fw in fireworks if not (fw.exploded and len(fw.particles) == 0)]
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:  # F3 显示/隐藏性能统计
+            timer.overlay = not timer.overlay
+
+    timer.mark("events")
+
+    # 按音频时钟取此刻听到的帧，一首结束立即接下一首（空中的烟花和粒子照常延续），列表放完即退出
+    if RENDER and RENDER.frames and frame_sink.count >= RENDER.frames:
+        break
+    music_frame = audio_clock.frame(FPS)
+    if music_frame >= TOTAL_FRAMES or audio_clock.finished():
+        current = next_track()
+        if current is None:
+            break
+        TOTAL_FRAMES, schedule, audio_clock = current
+        music_frame = audio_clock.frame(FPS)
+    # 按发射表发射到期的烟花
+    for amp, height, size_type in schedule.due(music_frame):
+        fireworks.spawn(amp=amp, size_type=size_type, height=height)
+    timer.mark("audio")
+
+    # 固定步长推进模拟：渲染变慢时一帧内补跑多步，演出速度不随帧率变化
+    for _ in range(stepper.advance(1 / FPS if RENDER else None)):
+        particles.update()
+        fireworks.update()
+    timer.mark("update")
+
+    alpha = stepper.alpha
+    counts = {"粒子": len(particles), "烟花": len(fireworks)}
+    dirty.begin(screen)
+    if dirty.enabled:
+        # 绘制前标记本帧要画的区域（粒子、火箭头、统计面板）
+        dirty.mark_boxes(*particles.bounds(alpha))
+        for f in fireworks:
+            if not f.exploded:
+                dirty.mark_circle(*f.head(alpha))
+        dirty.mark_rect(timer.overlay_rect(counts, quality.label()))
+    dirty.clear(screen, (0,0,0))
+    particles.draw(screen, alpha)
+    fireworks.draw(screen, alpha)  # 火箭头画在所有火花之上：新升空的火箭不被之前的爆炸遮住，与原来逐个烟花绘制相同
 
     # 绘制文字
-    screen.blit(text_surface, text_rect)
+    dirty.blit(screen, text_surface, text_rect)
 
    
 
-    pygame.display.flip()
-    clock.tick(FPS)
-    frame_count += 1
-
-pygame.mixer.music.stop()
+    timer.draw_overlay(screen, counts, quality.label())
+    timer.mark("draw")
+    dirty.present()  # 整屏时 flip，否则只提交重画的矩形
+    timer.mark("flip")
+    startup.report()  # 第一帧画完：--startup-report 时打印启动耗时
+    if RENDER:
+        frame_sink.write(screen)  # 离线渲染：逐帧推进，不等待时钟
+        audio_clock.tick()
+    else:
+        clock.tick(FPS)
+
+print(particles.report(), file=sys.stderr)
+print(fireworks.report(), file=sys.stderr)
+print(dirty.report(), file=sys.stderr)
+timer.write_csv()
+if RENDER:
+    frame_sink.close()
+else:
+    pygame.mixer.music.stop()
 pygame.quit()
 sys.exit()
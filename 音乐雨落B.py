@@ -1,18 +1,34 @@
+from startup import startup  # 第一条 import：启动耗时从这里开始计
+from offline_render import parse_render_args, setup_headless, FrameSink
 import pygame
 import sys
 import random
+import multiprocessing
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, simpledialog, messagebox
-from scipy.fft import rfft, rfftfreq
+from audio_analysis import load_audio, chunk_band_energy, chunk_lookahead, preload_audio
+from parallel_features import map_chunks
+from analysis_cache import AnalysisCache
+from frame_timing import FrameTimer
+from quality import QualityGovernor
+from timestep import FixedTimestep
+from audio_clock import OfflineClock, play_decoded
+from playlist import Playlist, playlist_paths
+from launch import launch_args
+from layers import LayerCache, vertical_gradient
+from rain import RainField, GROUND_OFFSET
+# 打包成可执行文件后，进程池的子进程也从这个入口启动：freeze_support() 让它们直接进入工作循环，不再弹窗、开窗口
+multiprocessing.freeze_support()
+startup.mark("导入模块")
 
 # ------------------------
 # 弹窗选择音乐和输入文字
 # ------------------------
 def choose_music_text():
+    import tkinter as tk  # 只有弹窗时才需要 tkinter
+    from tkinter import filedialog, simpledialog, messagebox
     root = tk.Tk()
     root.withdraw()
-    music_file = filedialog.askopenfilename(title="选择音乐文件", filetypes=[("MP3 Files","*.mp3")])
+    music_file = filedialog.askopenfilenames(title="选择音乐文件（可多选，按顺序连续播放）", filetypes=[("MP3 Files","*.mp3")])
     if not music_file:
         messagebox.showerror("错误", "未选择音乐文件")
         sys.exit()
@@ -22,16 +38,39 @@ def choose_music_text():
         sys.exit()
     return music_file, text
 
-MUSIC_FILE, TEXT = choose_music_text()
+LAUNCH = launch_args()        # --music / --playlist / --config 给出音乐时不弹窗
+RENDER = parse_render_args()  # --render 时离线渲染，不弹窗
+if RENDER:
+    setup_headless(RENDER.seed)
+    MUSIC_FILE, TEXT = RENDER.music, RENDER.text or ""
+elif LAUNCH:
+    MUSIC_FILE, TEXT = LAUNCH[0], LAUNCH[1] or ""
+else:
+    MUSIC_FILE, TEXT = choose_music_text()
+
+startup.mark("选择音乐")
+# 能量分析参数，同时是缓存键的一部分
+CHUNK_MS = 50
+CHUNK_WINDOW = None   # 频段分析的窗函数，如 "hann"；None 与原来的逐块 FFT 相同
+CHUNK_OVERLAP = 0.0   # 分析帧重叠比例，如 0.5 时每块用 100ms 的帧（块数、时间对齐不变）
+ENERGY_PARAMS = {"kind": "rain_energy", "chunk_ms": CHUNK_MS, "window": CHUNK_WINDOW, "overlap": CHUNK_OVERLAP}
+
+# 选好音乐后立即在后台解码第一首，与 pygame 初始化、建窗口、加载字体同时进行
+# 离线渲染且能量已缓存时根本用不到 PCM，不预解码（否则解码白做，结果还一直占着内存）
+cache = AnalysisCache()
+for path in playlist_paths(MUSIC_FILE)[:1]:
+    if not RENDER or cache.load(cache.key(path, ENERGY_PARAMS)) is None:
+        preload_audio(path, cache)
 
 # ------------------------
 # 初始化 Pygame
 # ------------------------
 pygame.init()
 infoObject = pygame.display.Info()
-WIDTH, HEIGHT = infoObject.current_w, infoObject.current_h
+WIDTH, HEIGHT = RENDER.size if RENDER else (infoObject.current_w, infoObject.current_h)
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("音乐雨落")
+startup.mark("初始化窗口")
 
 # ------------------------
 # 配置
@@ -42,8 +81,10 @@ TEXT_COLOR = (255, 255, 255)
 TEXT_ALPHA = 120
 TEXT_FONT_SIZE = 86
 TEXT_POS_RATIO = (0.5, 0.25)
-MAX_RAIN = 250
+RAIN_PER_MEGAPIXEL = 3000  # 每百万像素的雨滴上限：1080p 约 6200，4K 约 25000
+MAX_RAIN = max(250, int(RAIN_PER_MEGAPIXEL * WIDTH * HEIGHT / 1e6))
 MIN_RAIN = 20
+MAX_SPLASHES = 600         # 同时存在的水花上限，雨滴很多时水花不会无限增加
 
 # ------------------------
 # 字体
@@ -51,48 +92,40 @@ MIN_RAIN = 20
 font = pygame.font.SysFont("Microsoft YaHei", TEXT_FONT_SIZE, bold=True)
 
 # ------------------------
-# 渐变背景
-# ------------------------
-def draw_gradient(surface, top_color, bottom_color):
-    for y in range(HEIGHT):
-        ratio = y / HEIGHT
-        r = int(top_color[0] * (1-ratio) + bottom_color[0] * ratio)
-        g = int(top_color[1] * (1-ratio) + bottom_color[1] * ratio)
-        b = int(top_color[2] * (1-ratio) + bottom_color[2] * ratio)
-        pygame.draw.line(surface, (r, g, b), (0, y), (WIDTH, y))
-
-# ------------------------
-# 雨滴类
-# ------------------------
-class Raindrop:
-    def __init__(self, w, h):
-        self.x = random.randint(0, w)
-        self.y = random.randint(-h, 0)
-        if random.random() < 0.6:
-            self.length = random.randint(8, 15)
-            self.speed = random.uniform(3, 6)
-            self.thickness = 1
-        else:
-            self.length = random.randint(15, 30)
-            self.speed = random.uniform(7, 15)
-            self.thickness = 2
-
-    def update(self, h, w, norm_energy, splashes, low_energy, high_energy):
-        self.y += self.speed * (1 + norm_energy * 1.5)
-        if self.y > h - 60:
-            # 调整水花概率：低音多，高音略少
-            low_ratio = low_energy / (low_energy + high_energy + 1e-6)
-            prob = 0.5 + 0.5 * low_ratio  # 低音比例越高，水花越多
-            if random.random() < prob:
-                splashes.append(Splash(self.x, h - 60, low_ratio, norm_energy))
-            self.y = random.randint(-30, 0)
-            # X 坐标根据低/高频分布
-            self.x = get_rain_x(low_energy, high_energy, w)
-
-    def draw(self, screen):
-        start = (int(self.x), int(self.y))
-        end = (int(self.x), int(self.y + self.length))
-        pygame.draw.line(screen, RAIN_COLOR, start, end, self.thickness)
+# 静态图层：渐变背景和文字只画一次，每帧各一次 blit（画面大小变化时自动重画）
+# ------------------------
+def paint_text(w, h):
+    text_surface = font.render(TEXT, True, TEXT_COLOR)
+    text_surface.set_alpha(TEXT_ALPHA)
+    return text_surface, text_surface.get_rect(center=(w*TEXT_POS_RATIO[0], h*TEXT_POS_RATIO[1])).topleft
+
+layers = LayerCache()
+layers.add("gradient", lambda w, h: (vertical_gradient(w, h, (10,10,40), (0,0,0)), (0, 0)))
+layers.add("text", paint_text)
+
+# ------------------------
+# 水花精灵图集：一个水花的样子只取决于实际画出的各圈整数半径和当前透明度，同样的组合只画一次
+# 半径每帧长 1.5、透明度每帧减 4，组合总数有限（两千种以内），运行中不再新建 Surface
+# ------------------------
+SPLASH_COLOR = (180, 200, 255)
+
+class RingAtlas:
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, radii, alpha):
+        """radii 为由内到外各圈的半径，第 i 圈透明度 alpha - i*30"""
+        key = (radii, alpha)
+        sprite = self.cache.get(key)
+        if sprite is None:
+            half = radii[-1] + 2
+            sprite = pygame.Surface((half*2, half*2), pygame.SRCALPHA)
+            for i, radius in enumerate(radii):
+                pygame.draw.circle(sprite, (*SPLASH_COLOR, max(0, alpha - i*30)), (half, half), radius, 2)
+            self.cache[key] = sprite
+        return sprite
+
+ring_atlas = RingAtlas()
 
 # ------------------------
 # 水花类
@@ -107,7 +140,7 @@ class Splash:
         self.growth = 1.5
         self.alpha = 220
         # 圈数随低音比例调整，低音多圈，高音少圈
-        self.rings = random.randint(2, max(2, int(4 * low_ratio)))
+        self.rings = max(1, quality.count(random.randint(2, max(2, int(4 * low_ratio)))))
         self.ring_offsets = [i*0.25 for i in range(self.rings)]
 
     def update(self):
@@ -116,81 +149,101 @@ class Splash:
         if self.alpha < 0:
             self.alpha = 0
 
-    def draw(self, screen):
-        if self.alpha > 0:
-            surface = pygame.Surface((self.max_radius*2, self.max_radius*2), pygame.SRCALPHA)
-            for i in range(self.rings):
-                radius = int(self.radius * (0.6 + self.ring_offsets[i]))
-                if radius < self.max_radius:
-                    alpha = max(0, self.alpha - i*30)
-                    pygame.draw.circle(surface, (180, 200, 255, alpha), (self.max_radius, self.max_radius), radius, 2)
-            screen.blit(surface, (self.x - self.max_radius, self.y - self.max_radius))
+    def sprite(self):
+        """返回 (图集中的精灵, 左上角坐标)；已透明或没有一圈在范围内时返回 None"""
+        if self.alpha <= 0:
+            return None
+        radii = tuple(r for r in (int(self.radius * (0.6 + offset)) for offset in self.ring_offsets)
+                      if r < self.max_radius)
+        if not radii:
+            return None
+        sprite = ring_atlas.get(radii, self.alpha)
+        half = sprite.get_width() // 2
+        return sprite, (self.x - half, self.y - half)
 
     def is_dead(self):
         return self.alpha <= 0
 
 # ------------------------
-# 读取音频能量数组
+# 读取音频能量数组（按文件内容哈希缓存到磁盘，重复播放时跳过解码和 FFT）
 # ------------------------
-from pydub import AudioSegment
-sound = AudioSegment.from_file(MUSIC_FILE)
-samples = np.array(sound.get_array_of_samples())
-samples = samples.reshape((-1, sound.channels))
-samples = samples.mean(axis=1)
-chunk_size = int(sound.frame_rate * 0.05)  # 50ms
-energy_array = []
-fft_chunks = []
-for i in range(0, len(samples), chunk_size):
-    chunk = samples[i:i+chunk_size]
-    energy_array.append(np.sqrt(np.mean(chunk**2)))
-    yf = np.abs(rfft(chunk))
-    xf = rfftfreq(len(chunk), 1/sound.frame_rate)
-    low_energy = np.sum(yf[(xf>=20)&(xf<=250)])
-    high_energy = np.sum(yf[(xf>250)&(xf<=2000)])
-    fft_chunks.append((low_energy, high_energy))
-energy_array = np.array(energy_array)
+def analyze_energy(sound):
+    samples = sound.samples.mean(axis=1, dtype=np.float32)  # 直接混成 float32 单声道，不生成整首的 float64 副本
+    chunk_size = int(sound.frame_rate * CHUNK_MS / 1000)
+    # 长曲目按块边界切段，多进程并行（--serial 强制单进程），结果与单进程逐位一致
+    energy, bands = map_chunks(samples, chunk_size, chunk_band_energy,
+                               (sound.frame_rate, chunk_size, CHUNK_WINDOW, CHUNK_OVERLAP),
+                               frame_rate=sound.frame_rate, lookahead=chunk_lookahead(chunk_size, CHUNK_OVERLAP))
+    arrays = {"energy": energy, "bands": bands}
+    return arrays, {"frame_rate": sound.frame_rate, "duration": sound.duration}
 
-# ------------------------
-# 获取雨滴x位置：低频集中，高频稀疏
-# ------------------------
-def get_rain_x(low_energy, high_energy, w):
-    ratio = low_energy / (low_energy + high_energy + 1e-6)
-    center = int(w * 0.5)
-    spread = int(w * (0.2 + 0.5*(1-ratio)))  # 低频集中, spread小，高频稀疏
-    return random.randint(max(0, center - spread), min(w, center + spread))
+def prepare_track(path):
+    """播放列表模式下在后台线程里运行；长曲目的分块计算仍交给进程池
+    实时播放用同一份解码结果（与其他场景共用 PCM 缓存，也能直接取到预解码的结果），不再按路径让 mixer 重新解码"""
+    audio = None if RENDER else load_audio(path, cache)
+    features, _ = cache.get_or_compute(path, ENERGY_PARAMS,
+                                       lambda: analyze_energy(audio if audio is not None else load_audio(path, cache)))
+    return audio, features["energy"], features["bands"]  # bands 每行 (低频能量, 高频能量)
 
-# ------------------------
-# 播放音乐
-# ------------------------
-pygame.mixer.init()
-pygame.mixer.music.load(MUSIC_FILE)
-pygame.time.wait(1000)  # 缓冲1秒
-pygame.mixer.music.play()
+# 播放列表（--playlist；未给出时只有选中的这一首）：播放当前曲目时，后台已在分析下一首
+tracks = iter(Playlist.from_argv(MUSIC_FILE, prepare_track))
+
+def next_track():
+    """取出下一首并开始播放，返回 (能量数组, 频段能量, 总帧数, 音频时钟)；列表放完时返回 None"""
+    track = next(tracks, None)
+    if track is None:
+        return None
+    audio, energy, bands = track
+    total_frames = int(len(energy) * CHUNK_MS / 1000 * FPS)
+    return energy, bands, total_frames, OfflineClock(FPS) if RENDER else play_decoded(audio)
+
+if RENDER:
+    frame_sink = FrameSink(RENDER.render, RENDER.format)
 
 # ------------------------
 # 主循环
 # ------------------------
 clock = pygame.time.Clock()
-rain = []
+rain = RainField(MAX_RAIN * 2, seed=RENDER.seed if RENDER else None)  # 能量大于 1 时目标数会超过 MAX_RAIN
 splashes = []
 
 smooth_energy = 0
 prev_energy = 0
 running = True
+timer = FrameTimer.from_argv()
+quality = QualityGovernor.from_argv(FPS, render=bool(RENDER))  # 帧耗时超预算时自动减少雨滴和水花圈数
+stepper = FixedTimestep(FPS, interpolate=not RENDER)  # 离线渲染每帧正好一步，不插值
+startup.mark("加载字体与场景")
+# 即将进入主循环时才开始播放，不再靠固定等待来缓冲
+current = next_track()
+if current is None:
+    sys.exit("没有可播放的音乐")
+energy_array, fft_chunks, track_frames, audio_clock = current
+startup.mark("等待解码与分析")
 
 while running:
+    timer.start()
+    quality.update(timer.last_work_ms())
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
         elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
             running = False
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:  # F3 显示/隐藏性能统计
+            timer.overlay = not timer.overlay
+    timer.mark("events")
 
-    # 播放位置同步
-    ms = pygame.mixer.music.get_pos()
-    if ms < 0:
-        running = False
+    # 播放位置同步：音频时钟给出此刻听到的位置（离线渲染时由帧号换算）
+    if RENDER and RENDER.frames and frame_sink.count >= RENDER.frames:
         break
-    chunk_index = int(ms / 50)
+    # 一首结束（离线渲染时按帧数判断）立即接下一首，雨滴和水花照常延续，列表放完即退出
+    if audio_clock.finished() or (RENDER and audio_clock.frame(FPS) >= track_frames):
+        current = next_track()
+        if current is None:
+            break
+        energy_array, fft_chunks, track_frames, audio_clock = current
+    ms = audio_clock.position() * 1000
+    chunk_index = int(ms / CHUNK_MS)
     if chunk_index >= len(energy_array):
         norm_energy = 0
         low_energy, high_energy = 0,0
@@ -202,45 +255,53 @@ while running:
 
     # 节拍触发额外雨滴
     if prev_energy > 0 and norm_energy / (prev_energy + 1e-6) > 1.6:
-        extra_drops = random.randint(3, 7)
-        for _ in range(extra_drops):
-            drop = Raindrop(WIDTH, HEIGHT)
-            drop.x = get_rain_x(low_energy, high_energy, WIDTH)
-            rain.append(drop)
+        rain.spawn(quality.count(random.randint(3, 7)), WIDTH, HEIGHT, low_energy, high_energy)
     prev_energy = norm_energy
 
     # 计算雨滴数量
-    target_rain = int(MAX_RAIN * smooth_energy)
+    target_rain = int(quality.scale(MAX_RAIN) * smooth_energy)
     target_rain = max(MIN_RAIN, target_rain)
-    while len(rain) < target_rain:
-        drop = Raindrop(WIDTH, HEIGHT)
-        drop.x = get_rain_x(low_energy, high_energy, WIDTH)
-        rain.append(drop)
-    if len(rain) > target_rain:
-        rain = rain[:target_rain]
-
-    # 更新雨滴和水花
-    for drop in rain:
-        drop.update(HEIGHT, WIDTH, smooth_energy, splashes, low_energy, high_energy)
-    for splash in splashes:
-        splash.update()
-    splashes = [s for s in splashes if not s.is_dead()]
+    rain.resize(target_rain, WIDTH, HEIGHT, low_energy, high_energy)
+
+    timer.mark("audio")
+
+    # 更新雨滴和水花：固定步长，渲染变慢时一帧内补跑多步，下落速度不随帧率变化
+    for _ in range(stepper.advance(1 / FPS if RENDER else None)):
+        splash_x = rain.update(HEIGHT, WIDTH, smooth_energy, low_energy, high_energy)
+        # 调整水花概率：低音多，高音略少（由雨滴场选出），水花总数有上限
+        low_ratio = low_energy / (low_energy + high_energy + 1e-6)
+        for x in splash_x[:max(0, quality.scale(MAX_SPLASHES) - len(splashes))].tolist():
+            splashes.append(Splash(x, HEIGHT - GROUND_OFFSET, low_ratio, smooth_energy))
+        for splash in splashes:
+            splash.update()
+        splashes = [s for s in splashes if not s.is_dead()]
+
+    timer.mark("update")
 
     # 绘制
-    draw_gradient(screen, (10,10,40), (0,0,0))
-    for drop in rain:
-        drop.draw(screen)
-    for splash in splashes:
-        splash.draw(screen)
+    layers.blit(screen, "gradient")
+    timer.mark("gradient")
+    alpha = stepper.alpha
+    rain.draw(screen, RAIN_COLOR, alpha)  # 所有雨滴一次写入像素
+    screen.blits([s for s in (splash.sprite() for splash in splashes) if s is not None], doreturn=False)  # 一次批量贴完
+    timer.mark("draw")
 
     # 绘制文字
-    text_surface = font.render(TEXT, True, TEXT_COLOR)
-    text_surface.set_alpha(TEXT_ALPHA)
-    rect = text_surface.get_rect(center=(WIDTH*TEXT_POS_RATIO[0], HEIGHT*TEXT_POS_RATIO[1]))
-    screen.blit(text_surface, rect)
+    layers.blit(screen, "text")
+    timer.draw_overlay(screen, {"雨滴": len(rain), "水花": len(splashes)}, quality.label())
+    timer.mark("text")
 
     pygame.display.flip()
-    clock.tick(FPS)
+    timer.mark("flip")
+    startup.report()  # 第一帧画完：--startup-report 时打印启动耗时
+    if RENDER:
+        frame_sink.write(screen)  # 离线渲染：逐帧推进，不等待时钟
+        audio_clock.tick()
+    else:
+        clock.tick(FPS)
 
+timer.write_csv()
+if RENDER:
+    frame_sink.close()
 pygame.quit()
 sys.exit()
@@ -1,21 +1,28 @@
+from startup import startup  # 第一条 import：启动耗时从这里开始计
+from offline_render import parse_render_args, setup_headless, FrameSink
 import pygame
 import sys
 import random
-import math
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, simpledialog
-from pydub import AudioSegment
-from pydub.playback import _play_with_simpleaudio
-import threading
-import time
-import wave
+from collections import OrderedDict
+from audio_analysis import load_audio, load_band_table, preload_audio
+from analysis_cache import AnalysisCache
+from frame_timing import FrameTimer
+from quality import QualityGovernor
+from timestep import FixedTimestep
+from audio_clock import OfflineClock, play_decoded
+from playlist import Playlist, playlist_paths
+from launch import launch_args
+from layers import LayerCache, vertical_gradient
+startup.mark("导入模块")
 
 # ------------------------ 弹窗选择音乐和输入文字 ------------------------
 def choose_music_text():
+    import tkinter as tk  # 只有弹窗时才需要 tkinter
+    from tkinter import filedialog, simpledialog
     root = tk.Tk()
     root.withdraw()
-    music_file = filedialog.askopenfilename(title="选择音乐文件", filetypes=[("MP3/ WAV Files","*.mp3;*.wav")])
+    music_file = filedialog.askopenfilenames(title="选择音乐文件（可多选，按顺序连续播放）", filetypes=[("MP3/ WAV Files","*.mp3;*.wav")])
     if not music_file:
         sys.exit("未选择音乐文件")
     text = simpledialog.askstring("输入文字","请输入要显示的文字：")
@@ -23,20 +30,75 @@ def choose_music_text():
         sys.exit("未输入文字")
     return music_file, text
 
-MUSIC_FILE, TEXT = choose_music_text()
+LAUNCH = launch_args()        # --music / --playlist / --config 给出音乐时不弹窗
+RENDER = parse_render_args()  # --render 时离线渲染，不弹窗
+if RENDER:
+    setup_headless(RENDER.seed)
+    MUSIC_FILE, TEXT = RENDER.music, RENDER.text or ""
+elif LAUNCH:
+    MUSIC_FILE, TEXT = LAUNCH[0], LAUNCH[1] or ""
+else:
+    MUSIC_FILE, TEXT = choose_music_text()
+
+startup.mark("选择音乐")
+# 选好音乐后立即在后台解码第一首，与 pygame 初始化、建窗口、加载字体同时进行
+cache = AnalysisCache()
+for path in playlist_paths(MUSIC_FILE)[:1]:
+    preload_audio(path, cache)
 
 # ------------------------ Pygame 初始化 ------------------------
 pygame.init()
 infoObject = pygame.display.Info()
-WIDTH, HEIGHT = infoObject.current_w, infoObject.current_h
+WIDTH, HEIGHT = RENDER.size if RENDER else (infoObject.current_w, infoObject.current_h)
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("音乐雪花堆积")
+startup.mark("初始化窗口")
 clock = pygame.time.Clock()
 FPS = 60
 
 font_size = 126
 font = pygame.font.SysFont("Microsoft YaHei", font_size, bold=True)
 
+# ------------------------ 雪花精灵缓存 ------------------------
+# 雪花的样子只由大小、亮度、旋转角决定：亮度和角度量化后查缓存，同样的雪花只画一次、只旋转一次
+# 按最近使用淘汰（LRU），最多 SPRITE_CACHE_SIZE 张；臂长的随机抖动用独立的随机数发生器，不影响雪花的生成和运动
+BRIGHTNESS_STEP = 8
+ANGLE_STEP = 15
+SPRITE_CACHE_SIZE = 2048
+
+class SnowSprites:
+    def __init__(self, capacity=SPRITE_CACHE_SIZE, seed=None):
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self.rng = random.Random(seed)
+
+    def get(self, layer, size, brightness, angle):
+        key = (layer, size, int(brightness) // BRIGHTNESS_STEP, round(angle / ANGLE_STEP) % (360 // ANGLE_STEP))
+        sprite = self.cache.get(key)
+        if sprite is not None:
+            self.cache.move_to_end(key)
+            return sprite
+        level = min(255, key[2] * BRIGHTNESS_STEP + BRIGHTNESS_STEP // 2)
+        sprite = self.cache[key] = self.render(size, level, key[3] * ANGLE_STEP)
+        if len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+        return sprite
+
+    def render(self, size, level, angle):
+        surf_size = size*3
+        surf = pygame.Surface((surf_size, surf_size), pygame.SRCALPHA)
+        center = surf_size // 2
+        pygame.draw.circle(surf, (level,level,level), (center, center), max(1,int(size*0.3)))
+        for i in range(6):
+            arm = i*np.pi/3
+            length = size*0.4 + self.rng.uniform(0,1)
+            x2 = center + length*np.cos(arm)
+            y2 = center + length*np.sin(arm)
+            pygame.draw.line(surf, (level,level,level), (center, center), (x2, y2), 1)
+        return pygame.transform.rotate(surf, angle)
+
+sprites = SnowSprites(seed=RENDER.seed if RENDER else None)
+
 # ------------------------ 雪花类 ------------------------
 class Snowflake:
     def __init__(self, w, h, norm_energy_low, norm_energy_high, snow_layer, layer_override=None):
@@ -71,27 +133,14 @@ class Snowflake:
 
         self.x = random.randint(0, w-1)
         self.y = random.randint(-h//2, 0)
+        self.prev_x, self.prev_y = self.x, self.y  # 上一步的位置，绘制时插值用
         self.offset = random.uniform(-0.05,0.05)
         self.angle = random.uniform(0,360)
         self.fixed = False
-        self.surface = self.create_surface()
-
-    def create_surface(self):
-        surf_size = self.size*3
-        surf = pygame.Surface((surf_size, surf_size), pygame.SRCALPHA)
-        center = surf_size // 2
-        pygame.draw.circle(surf, (self.brightness,self.brightness,self.brightness),
-                           (center, center), max(1,int(self.size*0.3)))
-        for i in range(6):
-            angle = i*np.pi/3
-            length = self.size*0.4 + random.uniform(0,1)
-            x2 = center + length*np.cos(angle)
-            y2 = center + length*np.sin(angle)
-            pygame.draw.line(surf, (self.brightness,self.brightness,self.brightness),
-                             (center, center), (x2, y2), 1)
-        return pygame.transform.rotate(surf, self.angle)
+        self.surface = sprites.get(self.layer, self.size, self.brightness, self.angle)
 
     def update(self, norm_energy_low, norm_energy_high):
+        self.prev_x, self.prev_y = self.x, self.y
         if self.fixed:
             return
         speed_factor = 1 + 0.2 * norm_energy_high
@@ -99,31 +148,32 @@ class Snowflake:
         self.x += self.offset
         self.offset += random.uniform(-0.005,0.005)
         self.offset = max(-0.05, min(0.05, self.offset))
-        if self.x < 0: self.x = WIDTH-1
-        if self.x >= WIDTH: self.x = 0
+        if self.x < 0: self.x = self.prev_x = WIDTH-1
+        if self.x >= WIDTH: self.x = self.prev_x = 0
 
         x_int = int(self.x)
         if self.y >= HEIGHT - self.snow_layer[x_int]:
             self.fixed = True
-            self.y = HEIGHT - self.snow_layer[x_int] - self.size//2
+            self.y = self.prev_y = HEIGHT - self.snow_layer[x_int] - self.size//2
             self.snow_layer[x_int] += self.size
 
         decay = 0.02 if self.layer>=2 else 0.05
         self.brightness = max(100, self.brightness - decay)
-        self.surface = self.create_surface()
+        self.surface = sprites.get(self.layer, self.size, self.brightness, self.angle)  # 亮度跨过量化档位时才换图
 
-    def draw(self, screen):
-        rect = self.surface.get_rect(center=(self.x,self.y))
+    def draw(self, screen, alpha=1.0):
+        # 固定步长插值，alpha=1 时正好是当前位置
+        x = self.x - (self.x - self.prev_x) * (1 - alpha)
+        y = self.y - (self.y - self.prev_y) * (1 - alpha)
+        rect = self.surface.get_rect(center=(x,y))
         screen.blit(self.surface, rect)
 
 # 雪人晃动参数
 snowman_amplitude = 5     # 晃动幅度（像素）
 snowman_speed = 2         # 晃动速度（弧度/s）
 
-def draw_snowman(screen, offset_x=0):
-    """在右下角绘制雪人，offset_x为水平偏移量"""
-    x = WIDTH - 100 + offset_x
-    y = HEIGHT - 100
+def draw_snowman(screen, x, y):
+    """以 (x, y)（头部中心）为基准绘制雪人"""
 
     # 身体
     pygame.draw.circle(screen, (255, 255, 255), (x, y + 60), 30)
@@ -145,90 +195,153 @@ def draw_snowman(screen, offset_x=0):
     # 围巾
     pygame.draw.rect(screen, (255, 0, 0), (x - 20, y + 10, 40, 5))
 
-# ------------------------ 音乐播放和能量分析 ------------------------
-def play_music_and_analyze(filename):
-    sound = AudioSegment.from_file(filename)
-    _play_with_simpleaudio(sound)
-    if filename.lower().endswith(".mp3"):
-        wav_file = filename.replace(".mp3",".wav")
-        sound.export(wav_file, format="wav")
-    else:
-        wav_file = filename
-    wf = wave.open(wav_file,'rb')
-    frame_rate = wf.getframerate()
-    n_frames = wf.getnframes()
-    raw_data = wf.readframes(n_frames)
-    wf.close()
-    data = np.frombuffer(raw_data, dtype=np.int16)
-    if sound.channels>1:
-        data = data[::sound.channels]
-    return data, frame_rate
-
-audio_data, frame_rate = play_music_and_analyze(MUSIC_FILE)
-start_time = time.time()
+def paint_snowman(w, h):
+    """雪人画在刚好装下它的透明小图层上，放在右下角"""
+    surface = pygame.Surface((100, 120), pygame.SRCALPHA)
+    draw_snowman(surface, 50, 25)
+    return surface, (w - 100 - 50, h - 100 - 25)
+
+def paint_text(w, h):
+    text_surface = font.render(TEXT, True, (255,255,255))
+    return text_surface, (w*0.5 - text_surface.get_width()/2, h*0.25)
+
+# ------------------------ 静态图层 ------------------------
+# 渐变背景、文字、雪人只画一次，每帧各一次 blit（画面大小变化时自动重画）
+layers = LayerCache()
+layers.add("gradient", lambda w, h: (vertical_gradient(w, h, (10,10,40), (0,0,0)), (0, 0)))
+layers.add("text", paint_text)
+layers.add("snowman", paint_snowman)
+
+# ------------------------ 音乐解码与频带特征 ------------------------
+# 只解码一次：播放和频带分析共用同一块 PCM，不再导出临时 WAV；缓存命中时直接映射 PCM
+# 频带特征整首一次算好（按曲目归一化到 0~1），主循环按帧查表，不再每帧做 FFT
+# 播放列表（--playlist；未给出时只有选中的这一首）：播放当前曲目时，后台已在解码、分析下一首
+SNOW_BANDS = {
+    "low": (0, 400),      # 低频：随雪花一起传入，留给雪花形态
+    "high": (400, None),  # 中高频：雪花下落速度、大雪花的出现
+}
+
+def prepare_track(path):
+    audio = load_audio(path, cache)
+    return audio, load_band_table(path, FPS, cache, audio).normalized().features(SNOW_BANDS)
+
+tracks = iter(Playlist.from_argv(MUSIC_FILE, prepare_track))
+
+def next_track():
+    """取出下一首并开始播放，返回 (频带特征, 总帧数, 音频时钟)；列表放完时返回 None"""
+    track = next(tracks, None)
+    if track is None:
+        return None
+    audio, features = track
+    total_frames = int(len(audio.channel(0)) / audio.frame_rate * FPS)
+    return features, total_frames, OfflineClock(FPS) if RENDER else play_decoded(audio)
+
+if RENDER:
+    frame_sink = FrameSink(RENDER.render, RENDER.format)
 
 # ------------------------ 堆积层 ------------------------
+# 落地的雪花不再动也不再变：印到积雪画布（渐变背景的副本）上后移出列表，列表里只剩下落中的雪花
+# 每帧把积雪画布整张贴一次代替背景渐变，开销只与下落中的雪花数量有关，不随歌曲时长增长
 snow_layer = [0 for _ in range(WIDTH)]
 snowflakes = []
+ground = layers.get("gradient", (WIDTH, HEIGHT))[0].copy()
+
+def bake_landed(flakes):
+    """把已落地的雪花印到积雪画布上，返回仍在下落的雪花"""
+    landed = [s for s in flakes if s.fixed]
+    if not landed:
+        return flakes
+    ground.blits([(s.surface, s.surface.get_rect(center=(s.x, s.y))) for s in landed], doreturn=False)
+    return [s for s in flakes if not s.fixed]
 
 # ------------------------ 主循环 ------------------------
 running = True
+timer = FrameTimer.from_argv()
+quality = QualityGovernor.from_argv(FPS, render=bool(RENDER))  # 帧耗时超预算时自动降低雪花生成速度
+stepper = FixedTimestep(FPS, interpolate=not RENDER)  # 离线渲染每帧正好一步，不插值
+startup.mark("加载字体与场景")
+# 即将进入主循环时才开始播放，音频时钟从这一刻起计
+current = next_track()
+if current is None:
+    sys.exit("没有可播放的音乐")
+features, track_frames, audio_clock = current
+startup.mark("等待解码与分析")
 while running:
-    # 背景渐变 夜空黑底
-    for i in range(HEIGHT):
-        ratio = i/HEIGHT
-        r = int(10*(1-ratio) + 0*ratio)
-        g = int(10*(1-ratio) + 0*ratio)
-        b = int(40*(1-ratio) + 0*ratio)
-        pygame.draw.line(screen, (r,g,b), (0,i), (WIDTH,i))
+    timer.start()
+    quality.update(timer.last_work_ms())
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT or (event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE):
             running = False
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:  # F3 显示/隐藏性能统计
+            timer.overlay = not timer.overlay
+    timer.mark("events")
 
     # 音乐能量分析
-    t = time.time() - start_time
-    idx = min(int(t*frame_rate), len(audio_data)-1)
-    window = audio_data[idx:min(idx+1024,len(audio_data))]
-    if len(window)==0: norm_energy_low = norm_energy_high = 0
+    if RENDER and RENDER.frames and frame_sink.count >= RENDER.frames:
+        break
+    # 一首结束立即接下一首，雪花和积雪照常延续；列表放完后雪继续下（离线渲染则结束）
+    if audio_clock.finished() or (RENDER and audio_clock.frame(FPS) >= track_frames):
+        current = next_track()
+        if current is not None:
+            features, track_frames, audio_clock = current
+        elif RENDER:
+            break
+    frame = audio_clock.frame(FPS)  # 此刻听到的帧
+    if frame >= len(features["low"]): norm_energy_low = norm_energy_high = 0  # 歌曲已结束
     else:
-        fft = np.fft.rfft(window)
-        freq = np.fft.rfftfreq(len(window), d=1/frame_rate)
-        low_mask = (freq<400)
-        high_mask = (freq>=400)
-        norm_energy_low = np.abs(fft[low_mask]).mean()/1e4
-        norm_energy_high = np.abs(fft[high_mask]).mean()/1e4
-        norm_energy_low = min(norm_energy_low,1.0)
-        norm_energy_high = min(norm_energy_high,1.0)
-
-    # ------------------------ 生成雪花 ------------------------
-    new_flakes = max(1, int(norm_energy_high*0.05))
-    for _ in range(new_flakes):
-        snowflakes.append(Snowflake(WIDTH, HEIGHT, norm_energy_low, norm_energy_high, snow_layer))
-    if norm_energy_high > 0.95 and random.random() < 0.001:
-        snowflakes.append(Snowflake(WIDTH, HEIGHT, norm_energy_low, norm_energy_high, snow_layer, layer_override=3))
-
-    # ------------------------ 更新雪花 ------------------------
-    for s in snowflakes:
-        s.update(norm_energy_low, norm_energy_high)
+        norm_energy_low = float(features["low"][frame])
+        norm_energy_high = float(features["high"][frame])
+    timer.mark("audio")
+
+    # 固定步长推进：渲染变慢时一帧内补跑多步，生成和下落速度不随帧率变化
+    for _ in range(stepper.advance(1 / FPS if RENDER else None)):
+        # ------------------------ 生成雪花 ------------------------
+        new_flakes = quality.count(max(1, int(norm_energy_high*0.05)))  # 低画质时按比例少生成
+        for _ in range(new_flakes):
+            snowflakes.append(Snowflake(WIDTH, HEIGHT, norm_energy_low, norm_energy_high, snow_layer))
+        if norm_energy_high > 0.95 and random.random() < 0.001:
+            snowflakes.append(Snowflake(WIDTH, HEIGHT, norm_energy_low, norm_energy_high, snow_layer, layer_override=3))
+        timer.mark("spawn")
+
+        # ------------------------ 更新雪花 ------------------------
+        for s in snowflakes:
+            s.update(norm_energy_low, norm_energy_high)
+        timer.mark("update")
 
     # ------------------------ 绘制雪花 ------------------------
+    # 背景渐变 夜空黑底 + 积雪，一次贴完
+    snowflakes = bake_landed(snowflakes)
+    screen.blit(ground, (0, 0))
+    timer.mark("gradient")
+    alpha = stepper.alpha
     for s in snowflakes:
-        s.draw(screen)
+        s.draw(screen, alpha)
+    timer.mark("draw")
 
     # ------------------------ 绘制文字 ------------------------
-    text_surface = font.render(TEXT, True, (255,255,255))
-    screen.blit(text_surface, (WIDTH*0.5 - text_surface.get_width()/2, HEIGHT*0.25))
+    layers.blit(screen, "text")
 
     # 计算雪人水平偏移（正弦晃动）
     #elapsed = time.time() - start_time
     #offset = snowman_amplitude * math.sin(elapsed * snowman_speed)
 
-    # 绘制雪人
-    draw_snowman(screen, offset_x=0)
+    # 绘制雪人（晃动时把 (offset, 0) 作为 offset 传入，只移动图层，不重画）
+    layers.blit(screen, "snowman")
+    timer.draw_overlay(screen, {"雪花": len(snowflakes)}, quality.label())
+    timer.mark("text")
 
     pygame.display.flip()
-    clock.tick(FPS)
+    timer.mark("flip")
+    startup.report()  # 第一帧画完：--startup-report 时打印启动耗时
+    if RENDER:
+        frame_sink.write(screen)  # 离线渲染：逐帧推进，不等待时钟
+        audio_clock.tick()
+    else:
+        clock.tick(FPS)
 
+timer.write_csv()
+if RENDER:
+    frame_sink.close()
 pygame.quit()
 sys.exit()